@@ -1,17 +1,44 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.datastructures import MutableHeaders
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from groq import Groq
-from gtts import gTTS
-import speech_recognition as sr
+import abc
+import asyncio
 import os
+import io
+import base64
 import json
+import wave
+import gzip
+import struct
+import hashlib
+import zlib
+import sqlite3
 import tempfile
 import subprocess
+import time
+import math
+import heapq
+import itertools
+import threading
+import cProfile
+import pstats
+from collections import Counter, OrderedDict, deque
+from itertools import islice
 from datetime import datetime
+from functools import lru_cache
+from contextlib import asynccontextmanager, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, List, Optional
 import re
+import string
+import difflib
+from bisect import bisect_left
+
+if TYPE_CHECKING:
+    import speech_recognition as sr  # imported lazily at runtime, see stt_service
 
 # Load environment variables
 load_dotenv()
@@ -25,15 +52,557 @@ def validate_environment():
 validate_environment()
 
 # ==================== INITIALIZE SERVICES ====================
-# Initialize Groq client
+# Upstream limits (override via environment)
+GROQ_MAX_CONCURRENCY = int(os.getenv("GROQ_MAX_CONCURRENCY", "64"))
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "100"))
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "60"))
+
+# Load groq, gtts and speech_recognition in the background right after startup
+# (0 = only on first use). Either way the port is bound before they are imported.
+WARMUP = os.getenv("WARMUP", "1") != "0"
+
+class LazyService:
+    """
+    A heavy module or client, loaded once on first use or by the warm-up.
+
+    get() is thread-safe, since the warm-up thread and a request may ask for
+    the same service at once. A failed load is remembered, not retried.
+    """
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self._loader = loader
+        self._lock = threading.Lock()
+        self.value = None
+        self.state = "cold"  # cold -> loading -> ready | failed
+        self.error = None
+        self.load_seconds = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.state in ("ready", "failed")
+
+    def get(self):
+        """The loaded value, or None if loading failed; blocks while it loads"""
+        if self.loaded:
+            return self.value
+        with self._lock:
+            if not self.loaded:
+                self.state = "loading"
+                start = time.perf_counter()
+                try:
+                    self.value = self._loader()
+                    self.state = "ready"
+                except Exception as e:
+                    print(f"Error loading {self.name}: {e}")
+                    self.error = str(e)
+                    self.state = "failed"
+                self.load_seconds = time.perf_counter() - start
+        return self.value
+
+    async def aget(self):
+        """get() without blocking the event loop on the first load"""
+        if self.loaded:
+            return self.value
+        return await asyncio.to_thread(self.get)
+
+    def stats(self) -> dict:
+        stats = {
+            "state": self.state,
+            "load_ms": round(self.load_seconds * 1000, 1) if self.load_seconds is not None else None,
+        }
+        if self.error:
+            stats["error"] = self.error
+        return stats
+
+groq_http_client = None
+
+def create_groq_client():
+    """AsyncGroq (so completions never block the event loop) over a shared, pooled connection"""
+    global groq_http_client
+    import httpx
+    from groq import AsyncGroq
+
+    groq_http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=GROQ_MAX_CONNECTIONS,
+            max_keepalive_connections=GROQ_MAX_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(GROQ_TIMEOUT, connect=10.0),
+    )
+    return AsyncGroq(api_key=os.getenv("GROQ_API_KEY"), http_client=groq_http_client)
+
+def load_gtts():
+    from gtts import gTTS
+    return gTTS
+
+def load_speech_recognition():
+    import speech_recognition
+    return speech_recognition
+
+def load_numpy():
+    import numpy
+    return numpy
+
+groq_service = LazyService("groq", create_groq_client)
+tts_service = LazyService("tts", load_gtts)
+stt_service = LazyService("stt", load_speech_recognition)
+faq_service = LazyService("faq", load_numpy)  # the FAQ cache's similarity index
+LAZY_SERVICES = (groq_service, tts_service, stt_service, faq_service)
+
+groq_client = None  # set on first use; benchmarks put a stand-in here
+
+async def get_groq_client():
+    """The Groq client, or None if it could not be created (e.g. no API key)"""
+    global groq_client
+    if groq_client is None:
+        groq_client = await groq_service.aget()
+    return groq_client
+
+# ==================== METRICS ====================
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")  # empty = request profiling disabled
+PROFILE_TOP_N = 60
+EVENT_LOOP_LAG_INTERVAL = 0.5
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+TOKEN_BUCKETS = (10, 50, 100, 250, 500, 1000, 2000, 4000, 8000)
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    """Render a {name="value",...} label set"""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Histogram:
+    """
+    Prometheus-style histogram with optional labels.
+
+    Thread-safe, since gTTS, ffmpeg and STT timings are observed on worker
+    threads. Rendered in the text exposition format by /metrics.
+    """
+
+    def __init__(self, name: str, documentation: str, buckets: tuple, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.labelnames = labelnames
+        self._series = {}  # label values -> [count per bucket..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labelvalues, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                le = prometheus_labels(self.labelnames, labelvalues, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = prometheus_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {values[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+@contextmanager
+def timed(histogram: Histogram, *labelvalues):
+    """Observe the wall time of the block"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *labelvalues)
+
+http_request_seconds = Histogram(
+    "fitbot_http_request_seconds", "Request handling time, to the last body byte", LATENCY_BUCKETS,
+    ("method", "route", "status"),
+)
+http_request_bytes = Histogram("fitbot_http_request_bytes", "Request body size", SIZE_BUCKETS, ("route",))
+http_response_bytes = Histogram("fitbot_http_response_bytes", "Response body size", SIZE_BUCKETS, ("route",))
+groq_request_seconds = Histogram(
+    "fitbot_groq_request_seconds", "Groq call time, excluding queueing (streams: to the last token)",
+    LATENCY_BUCKETS, ("model", "mode"),
+)
+groq_tokens = Histogram("fitbot_groq_tokens", "Tokens per Groq call from completion.usage", TOKEN_BUCKETS, ("model", "kind"))
+admission_wait_seconds = Histogram("fitbot_admission_wait_seconds", "Time spent waiting for an upstream slot", LATENCY_BUCKETS, ("queue",))
+tutorial_match_seconds = Histogram("fitbot_tutorial_match_seconds", "find_relevant_tutorials time", LATENCY_BUCKETS)
+faq_lookup_seconds = Histogram("fitbot_faq_lookup_seconds", "FAQ cache similarity search time", LATENCY_BUCKETS)
+tts_synthesis_seconds = Histogram("fitbot_tts_synthesis_seconds", "gTTS synthesis time", LATENCY_BUCKETS)
+tts_transcode_seconds = Histogram("fitbot_tts_transcode_seconds", "ffmpeg transcode time", LATENCY_BUCKETS, ("format",))
+stt_recognition_seconds = Histogram("fitbot_stt_recognition_seconds", "Audio decode and recognition time", LATENCY_BUCKETS, ("backend",))
+event_loop_lag_seconds = Histogram("fitbot_event_loop_lag_seconds", "Event loop scheduling delay", LATENCY_BUCKETS)
+
+HISTOGRAMS = (
+    http_request_seconds, http_request_bytes, http_response_bytes,
+    groq_request_seconds, groq_tokens, admission_wait_seconds,
+    tutorial_match_seconds, faq_lookup_seconds, tts_synthesis_seconds, tts_transcode_seconds,
+    stt_recognition_seconds, event_loop_lag_seconds,
+)
+
+def record_groq_usage(model: str, usage):
+    """Token counts from a completion's (or final stream chunk's) usage block"""
+    if usage is None:
+        return
+    if usage.prompt_tokens is not None:
+        groq_tokens.observe(usage.prompt_tokens, model, "prompt")
+    if usage.completion_tokens is not None:
+        groq_tokens.observe(usage.completion_tokens, model, "completion")
+
+# ==================== ADMISSION CONTROL ====================
+GROQ_MAX_QUEUE = int(os.getenv("GROQ_MAX_QUEUE", "256"))
+USER_RATE_PER_MINUTE = float(os.getenv("USER_RATE_PER_MINUTE", "30"))  # 0 = no per-user limit
+USER_RATE_BURST = int(os.getenv("USER_RATE_BURST", "10"))
+RATE_LIMIT_MAX_KEYS = 100000
+BULK_QUEUE_SHARE = 0.5  # bulk work may fill at most this share of a wait queue
+
+# Waiters are served lowest value first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+
+def overloaded(detail: str, retry_after: float) -> HTTPException:
+    """429 telling the client when to come back"""
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+class AdmissionQueue:
+    """
+    Concurrency limit for one upstream with a bounded, prioritized wait queue.
+
+    Up to `concurrency` callers run at once and up to `max_waiting` more wait,
+    interactive ahead of bulk. Beyond that callers are rejected at once with a
+    429 whose Retry-After comes from recent service times, instead of piling up
+    work that would time out anyway.
+    """
+
+    def __init__(self, name: str, description: str, concurrency: int, max_waiting: int):
+        self.name = name  # metric label
+        self.description = description  # for error messages
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.service_seconds = 1.0  # moving average of time spent holding a slot
+        self._waiters = []  # heap of (priority, seq, future)
+        self._waiting = 0
+        self._seq = itertools.count()
+
+    def retry_after(self) -> float:
+        return self.service_seconds * (self._waiting + 1) / self.concurrency
+
+    def check(self, priority: int = PRIORITY_INTERACTIVE):
+        """Raise 429 if a call at this priority would be rejected right now"""
+        if self.active < self.concurrency:
+            return
+        limit = self.max_waiting if priority == PRIORITY_INTERACTIVE else int(self.max_waiting * BULK_QUEUE_SHARE)
+        if self._waiting >= limit:
+            self.rejected += 1
+            raise overloaded(f"{self.description} is at capacity, retry later", self.retry_after())
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        """Hold one slot for the duration of the block"""
+        await self._acquire(priority)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.service_seconds += (time.perf_counter() - start - self.service_seconds) * 0.1
+            self._release()
+
+    async def _acquire(self, priority: int):
+        if self.active < self.concurrency and not self._waiting:
+            self.active += 1
+            self.admitted += 1
+            admission_wait_seconds.observe(0.0, self.name)
+            return
+        self.check(priority)
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._waiting += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # the slot was handed over just as this waiter went away
+            raise
+        finally:
+            self._waiting -= 1
+        self.admitted += 1
+        admission_wait_seconds.observe(time.perf_counter() - start, self.name)
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # the slot passes straight to the next waiter
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "waiting": self._waiting,
+            "max_waiting": self.max_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_service_ms": round(self.service_seconds * 1000, 1),
+        }
+
+class RateLimiter:
+    """Per-key token buckets: `rate_per_minute` sustained with bursts of `burst`, LRU-bounded"""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int):
+        self.rate = rate_per_minute / 60
+        self.burst = burst
+        self.max_keys = max_keys
+        self.limited = 0
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+
+    def acquire(self, key: str) -> float:
+        """Take a token: 0 if allowed, else seconds until one is available"""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated_at) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+            self.limited += 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "tracked_keys": len(self._buckets),
+            "limited": self.limited,
+        }
+
+# Caps in-flight Groq calls; a bounded number wait their turn, the rest get 429
+groq_admission = AdmissionQueue("groq", "Groq", GROQ_MAX_CONCURRENCY, GROQ_MAX_QUEUE)
+user_rate_limiter = RateLimiter(USER_RATE_PER_MINUTE, USER_RATE_BURST, RATE_LIMIT_MAX_KEYS)
+
+def enforce_rate_limit(key: str):
+    """429 if this user (or client address) is over its request rate"""
+    wait = user_rate_limiter.acquire(key)
+    if wait:
+        raise overloaded("Rate limit exceeded, slow down", wait)
+
+def client_key(request: Request) -> str:
+    """Rate-limit key for endpoints without a user_id"""
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+# ==================== WIRE FORMAT ====================
+# orjson and brotli are optional: without them bodies use the stdlib encoder and gzip only
 try:
-    groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-except Exception as e:
-    print(f"Error initializing Groq client: {e}")
-    groq_client = None
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))  # 0 = never compress
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/html")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # dynamic-content setting: most of the size win for a fraction of q11's CPU
+COMPRESSED_BODY_CACHE_SIZE = 256
+
+def encode_json(data) -> bytes:
+    """Serialize a response body: compact UTF-8, via orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by encode_json"""
+
+    def render(self, content) -> bytes:
+        return encode_json(content)
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """"br" or "gzip" from an Accept-Encoding header (br wins ties), or None"""
+    best, best_quality = None, 0.0
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if coding not in ("br", "gzip") or (coding == "br" and brotli is None):
+            continue
+        quality = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                quality = float(value)
+            except ValueError:
+                continue
+        if quality > best_quality or (quality == best_quality and coding == "br"):
+            best, best_quality = coding, quality
+    return best
+
+class CompressionMiddleware:
+    """
+    gzip or brotli for JSON and text responses of at least min_size bytes.
+
+    Only single-message bodies are compressed; streamed responses (SSE,
+    NDJSON, audio) pass through untouched so events still arrive as they are
+    produced. A body with an ETag (the tutorial catalog) is compressed once
+    per encoding and reused, and its ETag is sent weak since the bytes differ.
+    """
+
+    def __init__(self, app, min_size: int):
+        self.app = app
+        self.min_size = min_size
+        self._compressed = OrderedDict()  # (etag, encoding) -> compressed body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.min_size:
+            return await self.app(scope, receive, send)
+        accept = dict(scope.get("headers") or []).get(b"accept-encoding", b"").decode("latin-1")
+        encoding = negotiate_encoding(accept)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+
+        async def compressing_send(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message  # held until the first body message shows whether it streams
+                return
+            if start is not None:
+                if message["type"] == "http.response.body" and not message.get("more_body", False):
+                    message = self._compress(start, message, encoding)
+                await send(start)
+                start = None
+            await send(message)
+
+        await self.app(scope, receive, compressing_send)
+
+    def _compress(self, start: dict, message: dict, encoding: str) -> dict:
+        headers = MutableHeaders(raw=start["headers"])
+        if not headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES) or "content-encoding" in headers:
+            return message
+        headers.add_vary_header("Accept-Encoding")
+        body = message.get("body", b"")
+        if len(body) < self.min_size:
+            return message
+
+        etag = headers.get("etag")
+        key = (etag, encoding)
+        compressed = self._compressed.get(key) if etag else None
+        if compressed is None:
+            if encoding == "br":
+                compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+            else:
+                compressed = gzip.compress(body, GZIP_LEVEL, mtime=0)
+            if etag:
+                self._compressed[key] = compressed
+                if len(self._compressed) > COMPRESSED_BODY_CACHE_SIZE:
+                    self._compressed.popitem(last=False)
+        else:
+            self._compressed.move_to_end(key)
+
+        headers["Content-Encoding"] = encoding
+        headers["Content-Length"] = str(len(compressed))
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+        return {**message, "body": compressed}
 
 # Initialize FastAPI
-app = FastAPI(title="FitBot API - AI Fitness Assistant")
+app = FastAPI(title="FitBot API - AI Fitness Assistant", default_response_class=FastJSONResponse)
+
+@app.on_event("shutdown")
+async def close_http_clients():
+    """Release pooled upstream connections"""
+    if groq_http_client:
+        await groq_http_client.aclose()
+
+# Upload size caps per path, enforced while the body streams in
+STT_MAX_UPLOAD_MB = float(os.getenv("STT_MAX_UPLOAD_MB", "10"))
+BATCH_MAX_BODY_MB = float(os.getenv("BATCH_MAX_BODY_MB", "32"))  # /chat/batch is parsed whole before validation
+UPLOAD_LIMITS = {
+    "/stt": int(STT_MAX_UPLOAD_MB * 1024 * 1024),
+    "/voice-chat": int(STT_MAX_UPLOAD_MB * 1024 * 1024),
+    "/chat/batch": int(BATCH_MAX_BODY_MB * 1024 * 1024),
+}
+
+class UploadLimitMiddleware:
+    """
+    Reject request bodies over the per-path limit with 413.
+
+    Checks Content-Length up front, then counts bytes as they arrive (chunked
+    uploads), so an oversized upload is cut off without being read in full.
+    """
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope.get("path")) if scope["type"] == "http" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            return await self._reject(send, limit)
+
+        # Buffer up to the limit, then replay the body to the app
+        messages, received = [], 0
+        while True:
+            message = await receive()
+            messages.append(message)
+            if message["type"] != "http.request":
+                break
+            received += len(message.get("body", b""))
+            if received > limit:
+                return await self._reject(send, limit)
+            if not message.get("more_body", False):
+                break
+
+        async def replay():
+            return messages.pop(0) if messages else await receive()
+
+        await self.app(scope, replay, send)
+
+    @staticmethod
+    async def _reject(send, limit: int):
+        body = json.dumps({"detail": f"Upload too large (limit {limit // (1024 * 1024)} MB)"}).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+app.add_middleware(UploadLimitMiddleware, limits=UPLOAD_LIMITS)
 
 # CORS - Allow all origins for API access
 app.add_middleware(
@@ -44,156 +613,1073 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ==================== IN-MEMORY SESSION STORAGE ====================
-# Store chat history in memory (resets on server restart)
-chat_sessions = {}
+# Inside MetricsMiddleware, so response sizes are measured as sent
+app.add_middleware(CompressionMiddleware, min_size=COMPRESSION_MIN_BYTES)
+
+class MetricsMiddleware:
+    """
+    Time every request and measure its body sizes; optionally profile it.
+
+    Requests carrying `X-Profile: <PROFILE_TOKEN>` run under cProfile and get
+    the report back as text/plain instead of their normal body (the original
+    status is in X-Profile-Status). The profiler sees everything on the event
+    loop during the request, and only one request is profiled at a time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.profiling = False
+        self._routes = None  # endpoint -> route path, built on first use
+
+    def route_label(self, scope) -> str:
+        """Route template ("/tutorials/{exercise}"), so labels stay low-cardinality"""
+        if self._routes is None:
+            self._routes = {route.endpoint: route.path for route in app.routes if hasattr(route, "endpoint")}
+        return self._routes.get(scope.get("endpoint"), "unmatched")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        sizes = {"request": 0, "response": 0}
+        status = {"code": 500}
+
+        async def counting_receive():
+            message = await receive()
+            if message["type"] == "http.request":
+                sizes["request"] += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                sizes["response"] += len(message.get("body", b""))
+            await send(message)
+
+        headers = dict(scope.get("headers") or [])
+        profile = PROFILE_TOKEN and headers.get(b"x-profile", b"").decode("latin-1") == PROFILE_TOKEN
+        try:
+            if profile and not self.profiling:
+                await self._profiled(scope, counting_receive, counting_send)
+            else:
+                await self.app(scope, counting_receive, counting_send)
+        finally:
+            route = self.route_label(scope)
+            http_request_seconds.observe(time.perf_counter() - start, scope["method"], route, status["code"])
+            http_request_bytes.observe(sizes["request"], route)
+            http_response_bytes.observe(sizes["response"], route)
+
+    async def _profiled(self, scope, receive, send):
+        captured = {"status": 500}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+
+        self.profiling = True
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            profiler.disable()
+            self.profiling = False
+
+        report = io.StringIO()
+        pstats.Stats(profiler, stream=report).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        body = report.getvalue().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+                (b"x-profile-status", str(captured["status"]).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+# Outermost, so rejected uploads and CORS preflights are measured too
+app.add_middleware(MetricsMiddleware)
+
+event_loop_monitor = None
+
+async def monitor_event_loop():
+    """Sample how late the loop wakes a sleeping task; blocking calls show up here"""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(EVENT_LOOP_LAG_INTERVAL)
+        event_loop_lag_seconds.observe(max(0.0, loop.time() - start - EVENT_LOOP_LAG_INTERVAL))
+
+@app.on_event("startup")
+async def start_event_loop_monitor():
+    global event_loop_monitor
+    event_loop_monitor = asyncio.create_task(monitor_event_loop())
+
+@app.on_event("shutdown")
+async def stop_event_loop_monitor():
+    if event_loop_monitor:
+        event_loop_monitor.cancel()
+
+warmup_seconds = None
+
+def warm_up():
+    """Load every lazy service; runs on a worker thread once the app is serving"""
+    global warmup_seconds
+    start = time.perf_counter()
+    for service in LAZY_SERVICES:
+        service.get()
+    warmup_seconds = time.perf_counter() - start
+    print(f"Warm-up finished in {warmup_seconds:.2f}s: " + ", ".join(f"{s.name} {s.state}" for s in LAZY_SERVICES))
+
+@app.on_event("startup")
+async def start_warmup():
+    # Not awaited: startup must finish for uvicorn to start accepting connections
+    if WARMUP:
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+# ==================== SESSION STORAGE ====================
+# Worker processes (uvicorn reads the same variable). With more than one, sessions and
+# caches live in a SQLite file every worker opens, so they are shared instead of
+# duplicated cold per process.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB") or (
+    os.path.join(tempfile.gettempdir(), "fitbot-state.db") if WEB_CONCURRENCY > 1 else ""
+)  # "" = per-process memory
+
+# How long a shared cache read or write waits for another worker's write lock before
+# it gives up (a miss, or a skipped write); cache calls run on the event loop
+SHARED_CACHE_BUSY_MS = float(os.getenv("SHARED_CACHE_BUSY_MS", "20"))
+
+# Session reads and writes can't be dropped, so they wait for the lock here instead
+sqlite_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite")
+
+def open_sqlite(path: str, timeout: float = 30) -> sqlite3.Connection:
+    """Connection tuned for several processes sharing one file"""
+    db = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+    # WAL: readers never block the writer; NORMAL sync is durable enough for caches
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_MAX_MESSAGES = int(os.getenv("SESSION_MAX_MESSAGES", "100"))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH") or SHARED_STATE_DB or None  # unset = memory only
+
+class ConversationStore:
+    """
+    Server-side chat history keyed by user_id.
+
+    Bounded in memory with TTL and LRU eviction. With a db_path, sessions are
+    written through to SQLite so they survive a restart; evicted sessions are
+    reloaded from disk on the next access.
+
+    With shared=True (several worker processes on one db_path) SQLite is the
+    only copy: every read goes to the file and appends are atomic, so a user's
+    turns can land on any worker.
+
+    Request handlers use aget/aappend/aclear, which run on sqlite_executor when
+    there is a database so waiting for its lock never blocks the event loop.
+    """
+
+    def __init__(self, max_sessions: int, ttl_seconds: float, max_messages: int, db_path: str = None, shared: bool = False):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.shared = shared and bool(db_path)
+        self.counted = 0  # shared mode: sessions in the file at the last alen()
+        self._sessions = OrderedDict()  # user_id -> (updated_at, history)
+        self._db = None
+        if db_path:
+            self._db = open_sqlite(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions "
+                "(user_id TEXT PRIMARY KEY, history TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions (updated_at)")
+            self._db.commit()
+
+    def __len__(self):
+        """Sessions in memory; never touches SQLite, so in shared mode it is the last alen() count"""
+        if self.shared:
+            return self.counted
+        return len(self._sessions)
+
+    async def alen(self) -> int:
+        """Live session count; in shared mode a COUNT on sqlite_executor"""
+        if self.shared:
+            self.counted = await self._offload(self._count)
+        return len(self)
+
+    def _count(self) -> int:
+        cutoff = time.time() - self.ttl_seconds
+        return self._db.execute("SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (cutoff,)).fetchone()[0]
+
+    async def aget(self, user_id: str) -> list:
+        return await self._offload(self.get, user_id)
+
+    async def aappend(self, user_id: str, messages: list) -> list:
+        return await self._offload(self.append, user_id, messages)
+
+    async def aclear(self, user_id: str):
+        await self._offload(self.clear, user_id)
+
+    async def _offload(self, fn, *args):
+        if self._db is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(sqlite_executor, fn, *args)
+
+    def get(self, user_id: str) -> list:
+        """Return the stored history for user_id (empty if unknown or expired)"""
+        history = self._load(user_id)
+        if self._db is not None:
+            self._db.commit()  # an expired session may have been deleted
+        return history
+
+    def _load(self, user_id: str) -> list:
+        now = time.time()
+        entry = None if self.shared else self._sessions.get(user_id)
+        if entry is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT updated_at, history FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row:
+                entry = (row[0], json.loads(row[1]))
+                if not self.shared:
+                    self._sessions[user_id] = entry
+        if entry is None:
+            return []
+        if now - entry[0] > self.ttl_seconds:
+            self._forget(user_id)  # no commit: append may be inside its transaction
+            return []
+        if not self.shared:
+            self._sessions.move_to_end(user_id)
+        return list(entry[1])
+
+    def append(self, user_id: str, messages: list) -> list:
+        """Append messages to user_id's history and return the updated history"""
+        now = time.time()
+        if self.shared:
+            # Read-modify-write under the write lock so concurrent workers can't drop a turn
+            self._db.execute("BEGIN IMMEDIATE")
+        try:
+            history = (self._load(user_id) + messages)[-self.max_messages:]
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (user_id, history, updated_at) VALUES (?, ?, ?)",
+                    (user_id, json.dumps(history), now),
+                )
+                self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+                self._db.commit()
+        except Exception:
+            if self._db is not None:
+                self._db.rollback()
+            raise
+        if not self.shared:
+            self._sessions[user_id] = (now, history)
+            self._sessions.move_to_end(user_id)
+            self._evict(now)
+        return history
+
+    def clear(self, user_id: str):
+        """Forget user_id's history"""
+        self._forget(user_id)
+        if self._db is not None:
+            self._db.commit()
+
+    def _forget(self, user_id: str):
+        self._sessions.pop(user_id, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def _evict(self, now: float):
+        # Drop expired sessions from the LRU end, then enforce the size bound
+        while self._sessions:
+            user_id, (updated_at, _) = next(iter(self._sessions.items()))
+            if now - updated_at <= self.ttl_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            self._sessions.popitem(last=False)
+
+# Opt-in server-side history (ChatRequest.session=True)
+chat_sessions = ConversationStore(
+    max_sessions=SESSION_MAX_SESSIONS,
+    ttl_seconds=SESSION_TTL_SECONDS,
+    max_messages=SESSION_MAX_MESSAGES,
+    db_path=SESSION_DB_PATH,
+    shared=bool(SHARED_STATE_DB),
+)
+
+# ==================== CACHES ====================
+class TTLCache:
+    """In-process LRU cache with a per-entry TTL and hit/miss counters"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (time.time() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def pop(self, key):
+        self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+class SharedCache:
+    """
+    TTLCache drop-in kept in a SQLite table that every worker process opens.
+
+    Keys and values round-trip through JSON (tuples come back as lists). When
+    over max_size, the entries closest to expiry go first. Hit/miss counters
+    are per process; size is for the whole table, as of the last sweep, so
+    stats() never queries SQLite.
+
+    Calls run on the event loop, so each waits at most SHARED_CACHE_BUSY_MS for
+    another worker's write lock; past that a read is a miss and a write is
+    skipped (counted as `busy`).
+    """
+
+    PRUNE_EVERY = 64  # writes between size/expiry sweeps
+
+    def __init__(self, db_path: str, namespace: str, max_size: int, ttl_seconds: float):
+        self.namespace = namespace
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.busy = 0
+        self._writes = 0
+        self._db = open_sqlite(db_path, timeout=SHARED_CACHE_BUSY_MS / 1000)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache (namespace TEXT NOT NULL, key TEXT NOT NULL, "
+            "value TEXT NOT NULL, expires_at REAL NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache (namespace, expires_at)")
+        self._db.commit()
+        self._size = len(self)
+
+    def __len__(self):
+        return self._db.execute(
+            "SELECT COUNT(*) FROM cache WHERE namespace = ? AND expires_at >= ?", (self.namespace, time.time())
+        ).fetchone()[0]
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired"""
+        try:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, json.dumps(key))
+            ).fetchone()
+        except sqlite3.OperationalError:
+            row = None
+            self.busy += 1
+        if row is None or row[1] < time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value):
+        def write():
+            self._db.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, json.dumps(key), json.dumps(value), time.time() + self.ttl_seconds),
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY == 0:
+                self._prune()
+        self._write(write)
+
+    def pop(self, key):
+        self._write(lambda: self._db.execute(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, json.dumps(key))
+        ))
+
+    def _write(self, statements):
+        try:
+            statements()
+            self._db.commit()
+        except sqlite3.OperationalError:
+            # Another worker held the write lock too long; a lost cache write only costs a miss
+            self._db.rollback()
+            self.busy += 1
+
+    def _prune(self):
+        self._db.execute("DELETE FROM cache WHERE namespace = ? AND expires_at < ?", (self.namespace, time.time()))
+        self._size = len(self)
+        excess = self._size - self.max_size
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache WHERE namespace = ? "
+                "ORDER BY expires_at LIMIT ?)",
+                (self.namespace, excess),
+            )
+            self._size = self.max_size
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": self._size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "busy": self.busy,
+            "shared": True,
+        }
+
+def make_cache(namespace: str, max_size: int, ttl_seconds: float):
+    """A SharedCache in multi-worker mode, else an in-process TTLCache"""
+    if SHARED_STATE_DB:
+        return SharedCache(SHARED_STATE_DB, namespace, max_size, ttl_seconds)
+    return TTLCache(max_size=max_size, ttl_seconds=ttl_seconds)
+
+class AudioCache:
+    """
+    Content-addressed audio cache: a memory tier in front of a disk tier.
+
+    Both tiers are LRU and bounded by total bytes. Disk writes go to a temp
+    file that is renamed into place, so readers never see a partial file.
+    With shared_directory, a memory miss also checks the disk for files other
+    worker processes wrote; each process bounds only the files it knows of.
+
+    Index bookkeeping happens on the event loop; file reads, writes and
+    removals run on `executor` (write_file is called from the job that
+    synthesized the audio).
+    """
+
+    def __init__(
+        self, memory_bytes: int, disk_bytes: int, directory: str = None, shared_directory: bool = False,
+        executor: ThreadPoolExecutor = None,
+    ):
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.directory = directory
+        self.shared_directory = shared_directory  # other processes write here too
+        self.executor = executor
+        self._memory = OrderedDict()  # key -> audio bytes
+        self._memory_used = 0
+        self._disk = OrderedDict()  # key -> size, least recently used first
+        self._disk_used = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            entries = []
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if name.endswith(".tmp"):
+                    os.remove(path)  # left over from a crash mid-write
+                    continue
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+            for _, name, size in sorted(entries):
+                self._disk[name] = size
+                self._disk_used += size
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Content address for the inputs that determine the audio"""
+        return hashlib.sha256("\x00".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    async def aget(self, key: str):
+        """Cached audio bytes, or None"""
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            self.bytes_saved += len(data)
+            return data
+
+        if self.directory and (key in self._disk or self.shared_directory):
+            data = await asyncio.get_running_loop().run_in_executor(self.executor, self._read_file, key)
+            if data is None:
+                self._forget_disk(key)
+            else:
+                if key not in self._disk:
+                    # Written by another worker process
+                    self._disk[key] = len(data)
+                    self._disk_used += len(data)
+                self._disk.move_to_end(key)
+                self._remember(key, data)
+                self.disk_hits += 1
+                self.bytes_saved += len(data)
+                return data
+
+        self.misses += 1
+        return None
+
+    def write_file(self, key: str, data: bytes) -> bool:
+        """Put audio in the disk tier; blocking. Pass the result to add()."""
+        if not self.directory or len(data) > self.disk_bytes:
+            return False
+        path = os.path.join(self.directory, key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"TTS cache write error: {e}")
+            return False
+        return True
+
+    def add(self, key: str, data: bytes, on_disk: bool = False):
+        """Index new audio: always in memory, on disk if write_file stored it"""
+        self._remember(key, data)
+        if not on_disk:
+            return
+        self._forget_disk(key, remove=False)
+        self._disk[key] = len(data)
+        self._disk_used += len(data)
+        while self._disk_used > self.disk_bytes:
+            self._forget_disk(next(iter(self._disk)))
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_used -= len(self._memory.pop(key))
+        self._memory[key] = data
+        self._memory_used += len(data)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    def _read_file(self, key: str):
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _forget_disk(self, key: str, remove: bool = True):
+        size = self._disk.pop(key, None)
+        if size is None:
+            return
+        self._disk_used -= size
+        if remove:
+            if self.executor is None:
+                self._remove_file(key)
+            else:
+                self.executor.submit(self._remove_file, key)
+
+    def _remove_file(self, key: str):
+        try:
+            os.remove(os.path.join(self.directory, key))
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "disk_entries": len(self._disk),
+            "disk_bytes": self._disk_used,
+        }
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key runs the
+    work, callers arriving while it is in flight await the same result.
+
+    Nothing is kept once the call finishes, so this is not a cache. Waiters are
+    shielded while others remain: a disconnecting client does not cancel the
+    work for the others, but when the last waiter is cancelled so is the work.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}  # key -> asyncio.Future
+        self._waiters = {}  # future -> callers awaiting it
+
+    async def run(self, key, factory):
+        """Await factory() for key, sharing it with any identical call already running"""
+        if not self.enabled:
+            self.calls += 1
+            return await factory()
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            self.calls += 1
+            future = asyncio.ensure_future(factory())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[future] == 1 and not future.done():
+                # Nobody else wants the result: stop the work (and free its upstream slot)
+                self._forget(key, future)
+                future.cancel()
+            raise
+        finally:
+            self._waiters[future] -= 1
+            if not self._waiters[future]:
+                del self._waiters[future]
+
+    def _forget(self, key, future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+    def stats(self) -> dict:
+        requests = self.calls + self.coalesced
+        return {
+            "enabled": self.enabled,
+            "upstream_calls": self.calls,
+            "coalesced": self.coalesced,
+            "coalesce_rate": round(self.coalesced / requests, 4) if requests else 0.0,
+            "in_flight": len(self._in_flight),
+        }
 
 # ==================== MODELS ====================
 class ChatRequest(BaseModel):
     message: str
     user_id: str
     chat_history: list = []  # Client sends their own history
+    session: bool = False  # True = server keeps history; send only the new message
+    return_history: bool = True  # False = response carries only the new turn, not chat_history
+
+class BatchChatRequest(BaseModel):
+    items: List[ChatRequest]
+    parallelism: Optional[int] = None  # capped at BATCH_MAX_PARALLELISM
+    timeout_seconds: Optional[float] = None  # per item; defaults to BATCH_ITEM_TIMEOUT
 
 class TTSRequest(BaseModel):
     text: str
     language_code: str = "en"
+    format: Optional[str] = None  # mp3, wav or opus; falls back to the Accept header
 
 # ==================== YOUTUBE EXERCISE DATABASE ====================
-YOUTUBE_TUTORIALS = {
-    # Chest Exercises
-    "bench press": [
-        "https://www.youtube.com/watch?v=rT7DgCr-3pg",
-        "https://www.youtube.com/watch?v=gRVjAtPip0Y"
-    ],
-    "push ups": [
-        "https://www.youtube.com/watch?v=IODxDxX7oi4",
-        "https://www.youtube.com/watch?v=_l3ySVKYVJ8"
-    ],
-    "chest fly": [
-        "https://www.youtube.com/watch?v=eozdVDA78K0",
-        "https://www.youtube.com/watch?v=Z56EYFZemhk"
-    ],
-    
-    # Back Exercises
-    "pull ups": [
-        "https://www.youtube.com/watch?v=eGo4IYlbE5g",
-        "https://www.youtube.com/watch?v=fLw3i7FiXsE"
-    ],
-    "deadlift": [
-        "https://www.youtube.com/watch?v=ytGaGIn3SjE",
-        "https://www.youtube.com/watch?v=r4MzxtBKyNE"
-    ],
-    "rows": [
-        "https://www.youtube.com/watch?v=roCP6wCXPqo",
-        "https://www.youtube.com/watch?v=9efgcAjQe7E"
-    ],
-    
-    # Leg Exercises
-    "squats": [
-        "https://www.youtube.com/watch?v=ultWZbUMPL8",
-        "https://www.youtube.com/watch?v=gcNh17Ckjgg"
-    ],
-    "lunges": [
-        "https://www.youtube.com/watch?v=QOVaHwm-Q6U",
-        "https://www.youtube.com/watch?v=wrwwXE_x-pQ"
-    ],
-    "leg press": [
-        "https://www.youtube.com/watch?v=IZxyjW7MPJQ",
-        "https://www.youtube.com/watch?v=z7eQq-GN-Nc"
-    ],
-    
-    # Shoulder Exercises
-    "shoulder press": [
-        "https://www.youtube.com/watch?v=qEwKCR5JCog",
-        "https://www.youtube.com/watch?v=M2rwvNhTOu0"
-    ],
-    "lateral raises": [
-        "https://www.youtube.com/watch?v=3VcKaXpzqRo",
-        "https://www.youtube.com/watch?v=kDqklk1ZESo"
-    ],
-    
-    # Arm Exercises
-    "bicep curls": [
-        "https://www.youtube.com/watch?v=ykJmrZ5v0Oo",
-        "https://www.youtube.com/watch?v=av7-8igSXTs"
-    ],
-    "tricep dips": [
-        "https://www.youtube.com/watch?v=6kALZikXxLc",
-        "https://www.youtube.com/watch?v=0326dy_-CzM"
-    ],
-    
-    # Core Exercises
-    "plank": [
-        "https://www.youtube.com/watch?v=ASdvN_XEl_c",
-        "https://www.youtube.com/watch?v=pvIjsG5Svck"
-    ],
-    "crunches": [
-        "https://www.youtube.com/watch?v=Xyd_fa5zoEU",
-        "https://www.youtube.com/watch?v=MKmrqcoCZ-M"
-    ],
-    "russian twists": [
-        "https://www.youtube.com/watch?v=wkD8rjkodUI",
-        "https://www.youtube.com/watch?v=JyUqwkVpsi8"
-    ],
-    
-    # Cardio
-    "hiit": [
-        "https://www.youtube.com/watch?v=ml6cT4AZdqI",
-        "https://www.youtube.com/watch?v=cZnsLVArIt8"
-    ],
-    "running": [
-        "https://www.youtube.com/watch?v=brFHyOtTwH4",
-        "https://www.youtube.com/watch?v=_kGESn8ArrU"
-    ],
-    "burpees": [
-        "https://www.youtube.com/watch?v=TU8QYVW0gDU",
-        "https://www.youtube.com/watch?v=JZQA08SlJnM"
-    ],
-    
-    # Full Body
-    "full body workout": [
-        "https://www.youtube.com/watch?v=UBMk30rjy0o",
-        "https://www.youtube.com/watch?v=Yz6PmHcYbN0"
-    ],
-    "abs workout": [
-        "https://www.youtube.com/watch?v=DHD1-2P94DI",
-        "https://www.youtube.com/watch?v=1919eTCoESo"
-    ],
-    
-    # Weight Loss Specific
-    "weight loss workout": [
-        "https://www.youtube.com/watch?v=2MicE75thDQ",
-        "https://www.youtube.com/watch?v=kZDvg92tTMc"
-    ],
-    "fat burning": [
-        "https://www.youtube.com/watch?v=ml6cT4AZdqI",
-        "https://www.youtube.com/watch?v=cZnsLVArIt8"
-    ],
-    "home workout": [
-        "https://www.youtube.com/watch?v=UBMk30rjy0o",
-        "https://www.youtube.com/watch?v=Yz6PmHcYbN0"
-    ],
-    "beginner workout": [
-        "https://www.youtube.com/watch?v=oAPCPjnU1wA",
-        "https://www.youtube.com/watch?v=2MicE75thDQ"
-    ],
-}
+# The catalog lives in tutorials.json and is reloaded when the file changes
+TUTORIALS_PATH = os.getenv(
+    "TUTORIALS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tutorials.json")
+)
+TUTORIALS_RELOAD_INTERVAL = float(os.getenv("TUTORIALS_RELOAD_INTERVAL", "5"))
+TUTORIALS_CACHE_CONTROL = os.getenv("TUTORIALS_CACHE_CONTROL", "public, max-age=300")
+TUTORIALS_LOOKUP_CACHE_SIZE = 4096
+TUTORIALS_LOOKUP_CACHE_BYTES = 32 * 1024 * 1024  # broad partial matches can be large
+TUTORIALS_FUZZY_CANDIDATES = 50  # names sharing the most trigrams with a typo, compared with difflib
+
+# Punctuation -> space, so str.split() yields words (much faster than a regex findall)
+WORD_SPLIT_TABLE = str.maketrans({c: " " for c in string.punctuation + "\u2013\u2014\u2018\u2019\u201c\u201d\u2022\u2026"})
+
+def split_words(text: str) -> list:
+    """Lowercase words of text, split on whitespace and punctuation"""
+    return text.lower().translate(WORD_SPLIT_TABLE).split()
+
+@lru_cache(maxsize=65536)
+def normalize_word(word: str) -> str:
+    """Reduce a lowercase word to a singular stem so plurals match"""
+    if len(word) > 3:
+        if word.endswith("ies"):
+            return word[:-3] + "y"
+        if word.endswith(("ches", "shes", "sses", "xes")):
+            return word[:-2]
+        if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            return word[:-1]
+    return word
+
+def phrase_words(phrase: str) -> tuple:
+    """Normalized words of a phrase"""
+    return tuple(normalize_word(w) for w in split_words(phrase))
+
+class ExerciseMatcher:
+    """
+    Finds catalog exercises in free text in one linear pass.
+
+    The text is split into normalized words and each word is looked up in an
+    index of phrase first-words, so cost does not grow with catalog size.
+    Matches respect word boundaries ("rows" does not match "throws") and
+    accept plurals, hyphens and joined spellings ("Push-ups", "pushups").
+    """
+
+    def __init__(self, exercises, aliases: dict = None):
+        aliases = aliases or {}
+        self._order = {}
+        self._index = {}  # first word -> [(words, exercise)], longest phrase first
+        self._phrases = set()
+        self.max_phrase_chars = 0
+        for exercise in exercises:
+            self._order[exercise] = len(self._order)
+            for phrase in [exercise] + aliases.get(exercise, []):
+                words = phrase_words(phrase)
+                if not words:
+                    continue
+                self._add(words, exercise)
+                if len(words) > 1:
+                    self._add((normalize_word("".join(split_words(phrase))),), exercise)
+                self.max_phrase_chars = max(self.max_phrase_chars, len(phrase) + 4)
+        for candidates in self._index.values():
+            candidates.sort(key=lambda c: -len(c[0]))
+
+    def _add(self, words: tuple, exercise: str):
+        if (words, exercise) not in self._phrases:
+            self._phrases.add((words, exercise))
+            self._index.setdefault(words[0], []).append((words, exercise))
+
+    def find(self, text: str) -> list:
+        """Catalog exercises mentioned in text, in catalog order"""
+        words = list(map(normalize_word, split_words(text)))
+        found = set()
+        index = self._index
+        for i in [i for i, word in enumerate(words) if word in index]:
+            for phrase, exercise in index[words[i]]:
+                if len(phrase) == 1 or tuple(words[i:i + len(phrase)]) == phrase:
+                    found.add(exercise)
+                    break
+        return sorted(found, key=self._order.__getitem__)
+
+def trigrams(text: str) -> set:
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class TutorialCatalog:
+    """
+    One loaded version of tutorials.json.
+
+    Everything the tutorial endpoints need is built up front: an exact map on
+    normalized spelling, a word index with a sorted vocabulary for prefix
+    search, the free-text matcher, and the encoded response bodies with their
+    ETags. Instances are never mutated; a reload builds a new one.
+    """
+
+    def __init__(self, exercises: list, mtime: float = None):
+        self.mtime = mtime
+        self.tutorials = {}  # name -> links, in file order
+        self.aliases = {}
+        for entry in exercises:
+            name = entry["name"].lower().strip()
+            self.tutorials[name] = list(entry["links"])
+            if entry.get("aliases"):
+                self.aliases[name] = list(entry["aliases"])
+        self.matcher = ExerciseMatcher(self.tutorials, self.aliases)
+        self._order = {name: i for i, name in enumerate(self.tutorials)}
+
+        self._exact = {}  # "push up" -> "push ups"
+        self._word_index = {}  # "press" -> {"bench press", "leg press", ...}
+        for name in self.tutorials:
+            for phrase in [name] + self.aliases.get(name, []):
+                self._exact.setdefault(" ".join(phrase_words(phrase)), name)
+            for word in phrase_words(name):
+                self._word_index.setdefault(word, set()).add(name)
+        self._trigram_index = {}  # " sq" -> {"squats", "squat jumps", ...}, over _exact keys
+        for key in self._exact:
+            for gram in trigrams(key):
+                self._trigram_index.setdefault(gram, set()).add(key)
+        self._vocabulary = sorted(self._word_index)
+        self._lookups = OrderedDict()  # raw query -> encoded response (matches only)
+        self._lookup_bytes = 0
+        # The 404 body lists every exercise; encode that part once
+        self._available_json = encode_json(list(self.tutorials))
+        self._available_digest = hashlib.sha1(self._available_json).digest()
+
+        self.list_response = self._encode(200, {
+            "total_exercises": len(self.tutorials),
+            "exercises": [
+                {"exercise": name.title(), "tutorial_count": len(links), "links": links}
+                for name, links in self.tutorials.items()
+            ],
+        })
+        self.exercise_responses = {
+            name: self._encode(200, {"exercise": name.title(), "tutorials": links, "count": len(links)})
+            for name, links in self.tutorials.items()
+        }
+
+    def __len__(self):
+        return len(self.tutorials)
+
+    @staticmethod
+    def _encode(status: int, data) -> tuple:
+        body = encode_json(data)
+        return status, body, '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+    def lookup(self, query: str) -> tuple:
+        """(status, body, etag) for GET /tutorials/{query}; matches are memoized per query"""
+        response = self._lookups.get(query)
+        if response is None:
+            response = self._lookup(query)
+            if response[0] != 200:
+                return response  # misses are cheap to rebuild and unbounded in variety
+            self._lookups[query] = response
+            self._lookup_bytes += len(response[1])
+            while len(self._lookups) > TUTORIALS_LOOKUP_CACHE_SIZE or self._lookup_bytes > TUTORIALS_LOOKUP_CACHE_BYTES:
+                self._lookup_bytes -= len(self._lookups.popitem(last=False)[1][1])
+        return response
+
+    def _lookup(self, query: str) -> tuple:
+        words = phrase_words(query)
+
+        # Direct match
+        name = self._exact.get(" ".join(words))
+        if name:
+            return self.exercise_responses[name]
+
+        # Partial match
+        matches = self._partial(query, words)
+        if matches:
+            return self._encode(200, {
+                "matches": [{"exercise": n.title(), "tutorials": self.tutorials[n]} for n in matches],
+                "count": len(matches),
+            })
+
+        message = encode_json(f"No tutorials found for '{query}'. Try: squats, push ups, deadlift, etc.")
+        body = b'{"message":' + message + b',"available_exercises":' + self._available_json + b"}"
+        etag = hashlib.sha1(message + self._available_digest).hexdigest()[:20]
+        return 404, body, f'"{etag}"'
+
+    def _partial(self, query: str, words: tuple) -> list:
+        # Catalog names inside the query ("barbell bench press")
+        found = set(self.matcher.find(query))
+
+        # Names containing every query word; the last word may be a prefix ("bench pr")
+        if words:
+            candidates = None
+            for i, word in enumerate(words):
+                if i < len(words) - 1:
+                    names = self._word_index.get(word, set())
+                else:
+                    names = set()
+                    start = bisect_left(self._vocabulary, word)
+                    for vocab_word in self._vocabulary[start:]:
+                        if not vocab_word.startswith(word):
+                            break
+                        names |= self._word_index[vocab_word]
+                candidates = names if candidates is None else candidates & names
+                if not candidates:
+                    break
+            found |= candidates
+
+        # Fuzzy fallback for typos ("sqauts"), among the names sharing the most trigrams
+        if not found and words:
+            key = " ".join(words)
+            shared = Counter()
+            for gram in trigrams(key):
+                shared.update(self._trigram_index.get(gram, ()))
+            pool = [name for name, _ in shared.most_common(TUTORIALS_FUZZY_CANDIDATES)]
+            close = difflib.get_close_matches(key, pool, n=5, cutoff=0.8)
+            found = {self._exact[name] for name in close}
+
+        return sorted(found, key=self._order.__getitem__)
+
+def load_tutorial_catalog(path: str) -> TutorialCatalog:
+    """Read and index a tutorials.json file"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return TutorialCatalog(data["exercises"], mtime=os.path.getmtime(path))
+
+try:
+    tutorial_catalog = load_tutorial_catalog(TUTORIALS_PATH)
+except Exception as e:
+    print(f"Error loading tutorial catalog from {TUTORIALS_PATH}: {e}")
+    tutorial_catalog = TutorialCatalog([])
+catalog_checked_at = time.monotonic()
+
+def get_tutorial_catalog() -> TutorialCatalog:
+    """Current catalog; reloads tutorials.json when it changes on disk"""
+    global tutorial_catalog, catalog_checked_at
+    now = time.monotonic()
+    if now - catalog_checked_at >= TUTORIALS_RELOAD_INTERVAL:
+        catalog_checked_at = now
+        try:
+            if os.path.getmtime(TUTORIALS_PATH) != tutorial_catalog.mtime:
+                tutorial_catalog = load_tutorial_catalog(TUTORIALS_PATH)
+                print(f"Reloaded tutorial catalog: {len(tutorial_catalog)} exercises")
+        except Exception as e:
+            print(f"Error reloading tutorial catalog: {e}")
+    return tutorial_catalog
 
 def find_relevant_tutorials(text: str) -> list:
     """Find relevant YouTube tutorials based on text content"""
-    text_lower = text.lower()
-    found_tutorials = []
-    
-    for exercise, links in YOUTUBE_TUTORIALS.items():
-        if exercise in text_lower:
-            found_tutorials.append({
-                "exercise": exercise.title(),
-                "links": links
-            })
-    
-    return found_tutorials
+    with timed(tutorial_match_seconds):
+        catalog = get_tutorial_catalog()
+        return [
+            {"exercise": exercise.title(), "links": catalog.tutorials[exercise]}
+            for exercise in catalog.matcher.find(text)
+        ]
 
 # ==================== SYSTEM PROMPT ====================
+# Split into sections so each /chat turn only sends what its phase needs
+PROMPT_CORE = """
+You are FitBot, a friendly and energetic AI Fitness Coach who loves helping people achieve their fitness goals.
+
+🎯 YOUR PERSONALITY:
+- Conversational and friendly (like chatting with a personal trainer friend)
+- Enthusiastic and motivating
+- Patient and understanding
+- Ask ONE question at a time
+- Build rapport naturally through conversation
+
+🚨 IMPORTANT RULES:
+- ONLY discuss fitness, workouts, nutrition, wellness topics
+- For off-topic questions: "I'm your fitness coach! Let's focus on getting you in shape 💪"
+- NEVER dump all information at once
+- Have a natural conversation, not an interrogation
+
+🎯 KEY PRINCIPLES:
+
+1. **ONE QUESTION AT A TIME** - Never ask multiple questions in one message
+2. **CONVERSATIONAL TONE** - Talk like a friend, not a robot
+3. **BUILD GRADUALLY** - Gather info slowly through natural conversation
+4. **MATCH THEIR DAYS** - If they say 3 days, give 3 days. If 5 days, give 5 days!
+5. **SIMPLE ANSWERS** - Understand "yes", "home", "gym", "3 days", "5 days", etc.
+6. **DON'T REPEAT** - If you already know something, don't ask again
+7. **BE BRIEF** - Keep responses short and focused
+8. **ENCOURAGE** - Use motivating language throughout
+
+RESPONSE STYLE:
+- Use casual, friendly language
+- Short sentences and paragraphs
+- NO EMOJIS in your text (system adds them)
+- Reference what they told you earlier
+- Show you're listening and care
+
+SAFETY:
+- Always recommend warm-up before workouts
+- Emphasize proper form over quantity
+- Suggest doctor consultation for serious health concerns
+"""
+
+PROMPT_GREETING = """
+**PHASE 1: INITIAL GREETING & GOAL (Questions 1-2)**
+When user first messages:
+1. Greet them warmly
+2. Ask about their PRIMARY goal (weight loss, muscle gain, or athletic performance)
+3. Wait for their answer
+
+Example:
+User: "Hi"
+You: "Hey there! I'm FitBot, your AI fitness coach. I'm pumped to help you on your fitness journey! What brings you here today - are you looking to lose weight, build muscle, or improve your athletic performance?"
+"""
+
+PROMPT_QUESTIONING = """
+**PHASE 2: UNDERSTANDING THEIR SITUATION (Questions 3-6)**
+Ask ONE question at a time. Wait for each answer before asking the next:
+
+Question 3: "Got it! And where will you be working out - do you have a gym membership or will you be training at home?"
+
+Question 4: "Perfect! How many days per week can you realistically commit to working out? Be honest - consistency is key!"
+
+Question 5: "Awesome! Do you have any injuries or physical limitations I should know about?"
+
+Question 6: "Great! One last thing - what's your current experience level: beginner, intermediate, or have you been training for a while?"
+
+EXAMPLE CONVERSATION:
+
+User: "I want to lose weight"
+You: "That's awesome! Losing weight is a great goal. Where will you be working out - at home or do you have access to a gym?"
+
+User: "at home"
+You: "Perfect! Home workouts are super effective. How many days per week can you commit to training? 3 days? 4 days? More?"
+
+User: "5 days"
+You: "Wow, 5 days! That's fantastic commitment. Any injuries or physical limitations I should know about?"
+
+User: "no"
+You: "Excellent! Last question - are you a complete beginner, or have you worked out before?"
+
+User: "beginner"
+You: "Awesome! I love working with beginners. Alright, let me create your personalized 5-day plan..."
+"""
+
+PROMPT_PLAN = """
+**PHASE 3: PROVIDE RECOMMENDATIONS (Only after gathering 5-6 details)**
+Once you have enough information, say:
+"Alright, I've got everything I need! Let me put together a personalized plan for you. Give me a sec..."
+
+Then provide a plan based on THEIR REQUESTED NUMBER OF DAYS:
+
+**WORKOUT PLAN - MATCH THEIR DAYS:**
+- If they said "3 days" → Create a 3-day plan (Day 1, Day 2, Day 3)
+- If they said "4 days" → Create a 4-day plan (Day 1, Day 2, Day 3, Day 4)
+- If they said "5 days" → Create a 5-day plan (Day 1, Day 2, Day 3, Day 4, Day 5)
+- And so on...
+
+For each day, list 3-4 exercises with sets/reps:
+
+Example for 3 days:
+"Here's your 3-day workout plan:
+
+**Day 1 - Full Body:**
+- Push-ups: 3 sets of 10 reps
+- Squats: 3 sets of 15 reps
+- Plank: 3 sets of 30 seconds
+
+**Day 2 - Lower Body:**
+- Lunges: 3 sets of 12 reps each leg
+- Squats: 4 sets of 15 reps
+- Crunches: 3 sets of 15 reps
+
+**Day 3 - Upper Body & Cardio:**
+- Push-ups: 3 sets of 12 reps
+- Plank: 3 sets of 45 seconds
+- Burpees: 3 sets of 8 reps
+
+Check the YouTube tutorial links below for proper form!"
+
+**NUTRITION TIP:**
+One simple nutrition tip (1-2 sentences max)
+
+Example:
+"For weight loss, aim to eat 300-500 calories below your maintenance level. Drink 2-3 liters of water daily!"
+
+**FOLLOW-UP:**
+End with: "How does this sound? Ready to get started, or do you have any questions?"
+"""
+
+PROMPT_FLOW_HEADER = """
+📋 CONVERSATION FLOW - FOLLOW THIS EXACTLY:
+"""
+
+# Full original prompt, sent verbatim when PHASE_AWARE_PROMPT is off
 TRAINER_SYSTEM_PROMPT = """
 You are FitBot, a friendly and energetic AI Fitness Coach who loves helping people achieve their fitness goals.
 
@@ -379,39 +1865,150 @@ SAFETY:
 """
 
 # ==================== HELPER FUNCTIONS ====================
-def remove_emojis(text: str) -> str:
-    """Remove all emojis from a string."""
-    emoji_pattern = re.compile(
-        "[" 
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map symbols
-        "\U0001F1E0-\U0001F1FF"  # flags
-        "\U00002700-\U000027BF"  # Dingbats
-        "\U0001F900-\U0001F9FF"  # Supplemental Symbols and Pictographs
-        "\U00002600-\U000026FF"  # Misc symbols
-        "\U00002B00-\U00002BFF"  # Misc symbols & arrows
-        "\U0001FA70-\U0001FAFF"  # Extended Pictographic
-        "]+", flags=re.UNICODE
-    )
-    return emoji_pattern.sub(r'', text)
+# Emoji ranges (emoticons, pictographs, transport, flags, dingbats, misc symbols, extended),
+# plus the variation selector and zero-width joiner that glue emoji sequences together
+EMOJI_CHARS = (
+    "\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF"
+    "\U00002700-\U000027BF\U0001F900-\U0001F9FF\U00002600-\U000026FF\U00002B00-\U00002BFF"
+    "\U0001FA70-\U0001FAFF\uFE0F\u200D"
+)
+# Opens with one cheap character class so plain text is skipped quickly; the
+# lookbehind then keeps only the emoji ranges
+EMOJI_PATTERN = re.compile(f"[\u2600-\U0010FFFF](?<=[{EMOJI_CHARS}])[{EMOJI_CHARS}]*")
+MARKDOWN_MARKERS = ("*", "_", "#", "`")  # emphasis, headings, code
+
+# Structural rewrites, each anchored on a literal or a small class so the scan stays in C
+LINK_PATTERN = re.compile(r"\[([^\]\n]+)\]\([^)\n]*\)")  # [text](url) -> text
+UNPUNCTUATED_EOL_PATTERN = re.compile(r"\n(?<=[\w)]\n)")  # list item or heading end -> full stop
+LINE_START_PATTERN = re.compile(r"\n(?=[ \t]|[-+\u2022][ \t])[ \t]*(?:[-+\u2022](?=[ \t]))?[ \t]*")  # bullet/indent
+# Workout shorthand is only spelled out where the context says it is workout shorthand:
+# "in my 40s", "the 1990s", "a 4x4 grid" and "555-1234" are left for gTTS to read as written
+QUANTITY_WORDS = (
+    "reps?|sets?|rounds?|times|seconds?|secs?|minutes?|mins?|hours?|days?|weeks?|months?"
+    "|calories|calorie|kcal|liters?|litres?|glasses|cups|kg|lbs?|pounds|grams?|km|miles?|steps"
+)
+WORKOUT_NUMBER_PATTERN = re.compile(
+    r"(?P<n>[0-9](?<![0-9.][0-9])[0-9]*)(?:"
+    rf"[ \t]?[-\u2013][ \t]?(?P<hi>[0-9]+)(?=[ \t]*(?:{QUANTITY_WORDS})\b)"      # 8-10 reps -> 8 to 10 reps
+    r"|[ \t]*[xX\u00d7][ \t]*(?P<reps>[0-9]{1,3})\b(?=[ \t]*(?:reps?|sets?|rounds?)\b|[ \t]*(?:[\n,;(]|$))"
+    r"|[ \t]?(?P<unit>secs?|mins?)\b"                                             # 45 sec, 20 min
+    r"|(?P<seconds>s)\b)"                                                        # 30s, see SECONDS_CONTEXT
+)
+# 3x10 only when followed by reps/sets or the end of the item, and at most 99 sets
+MAX_SETS = 99
+# "30s" reads as seconds only after one of these words ("3 sets of 30s", "rest 60s")
+# or before one of them ("30s rest", "30s each side")
+SECONDS_CONTEXT = frozenset(("of", "for", "rest", "hold", "holds", "every", "each", "per", "side", "between"))
+
+SPOKEN_UNITS = {"sec": "seconds", "secs": "seconds", "min": "minutes", "mins": "minutes"}
+
+def _word_beside(text: str, start: int, end: int) -> tuple:
+    """The word before start and the word after end, lowercased"""
+    before = text[max(0, start - 12):start].split()
+    after = text[end:end + 12].split()
+    return (before[-1].lower() if before else "", after[0].lower().rstrip(".,;:") if after else "")
+
+def _spoken_number(match) -> str:
+    n = match.group("n")
+    kind = match.lastgroup
+    if kind == "hi":
+        return f"{n} to {match.group('hi')}"
+    if kind == "reps":
+        if int(n) > MAX_SETS:
+            return match.group(0)
+        return f"{n} sets of {match.group('reps')}"
+    if kind == "unit":
+        return f"{n} {SPOKEN_UNITS[match.group('unit')]}"
+    if SECONDS_CONTEXT.isdisjoint(_word_beside(match.string, match.start(), match.end())):
+        return match.group(0)
+    return f"{n} seconds"
 
 def clean_text_for_tts(text: str) -> str:
-    """Clean text for TTS: remove emojis and Markdown formatting."""
-    text = remove_emojis(text)
-    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
-    text = re.sub(r'\*([^*]+)\*', r'\1', text)
-    text = re.sub(r'[\*_]+', '', text)
-    text = re.sub(r'#+', '', text)
-    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
-    text = re.sub(r'`+', '', text)
-    return text.strip()
+    """Clean text for TTS: remove emojis and Markdown formatting, spell out workout shorthand."""
+    # The leading newline lets a bullet on the first line match like any other
+    text = EMOJI_PATTERN.sub("", "\n" + text)
+    # Plain deletions; str.replace scans with memchr, while str.translate falls back to
+    # a per-character dict lookup as soon as the reply holds any non-ASCII character
+    for marker in MARKDOWN_MARKERS:
+        text = text.replace(marker, "")
+    text = LINK_PATTERN.sub(r"\1", text)
+    # Before the full stops below, so "3x15" still ends its list item
+    text = WORKOUT_NUMBER_PATTERN.sub(_spoken_number, text)
+    # An unpunctuated line (list item, heading) gets a full stop so gTTS pauses there
+    text = UNPUNCTUATED_EOL_PATTERN.sub(".\n", text)
+    return LINE_START_PATTERN.sub("\n", text).strip()
+
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") != "0"  # 0 = every request makes its own upstream call
+
+# Identical Groq completions in flight at once share one call
+llm_flight = SingleFlight(enabled=SINGLE_FLIGHT)
+
+def completion_key(messages: list, kwargs: dict) -> str:
+    """Digest of the normalized messages and model parameters"""
+    normalized = [[msg["role"], " ".join(msg["content"].split())] for msg in messages]
+    payload = json.dumps([normalized, kwargs], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+async def create_chat_completion(messages: list, priority: int = PRIORITY_INTERACTIVE, timeout: float = None, **kwargs):
+    """Call Groq through the shared client, admitted by groq_admission.
+
+    `timeout` bounds the upstream call only, not the wait for a slot; calls
+    made with one (the routed calls) are tracked in model_stats.
+    """
+    async def call():
+        model = kwargs.get("model")
+        async with groq_admission.slot(priority):
+            start = time.perf_counter()
+            try:
+                with timed(groq_request_seconds, model, "complete"):
+                    client = await get_groq_client()
+                    async with asyncio.timeout(timeout):
+                        completion = await client.chat.completions.create(messages=messages, **kwargs)
+            except Exception as e:
+                if timeout is not None:
+                    record_model_call(model, error=e)
+                raise
+            if timeout is not None:
+                record_model_call(model, time.perf_counter() - start)
+        record_groq_usage(model, getattr(completion, "usage", None))
+        return completion
+
+    return await llm_flight.run(completion_key(messages, kwargs), call)
+
+async def stream_chat_completion(messages: list, first_token_timeout: float = None, **kwargs):
+    """Yield reply text deltas from Groq; holds a concurrency slot until the stream ends.
+
+    `first_token_timeout` bounds the time from getting a slot to the first
+    delta; streams made with one (the routed calls) are tracked in model_stats.
+    """
+    model = kwargs.get("model")
+    async with groq_admission.slot():
+        start = time.perf_counter()
+        try:
+            with timed(groq_request_seconds, model, "stream"):
+                client = await get_groq_client()
+                async with asyncio.timeout(first_token_timeout) as deadline:
+                    stream = await client.chat.completions.create(messages=messages, stream=True, **kwargs)
+                    async for chunk in stream:
+                        x_groq = getattr(chunk, "x_groq", None)
+                        if x_groq is not None:
+                            # Groq reports usage on the final chunk
+                            record_groq_usage(model, x_groq.usage)
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            deadline.reschedule(None)
+                            yield chunk.choices[0].delta.content
+        except Exception as e:
+            if first_token_timeout is not None:
+                record_model_call(model, error=e)
+            raise
+        if first_token_timeout is not None:
+            record_model_call(model, time.perf_counter() - start)
 
 # ==================== ROOT ENDPOINT ====================
 @app.get("/")
 async def root():
     """API information endpoint"""
-    return JSONResponse({
+    return FastJSONResponse({
         "status": "healthy", 
         "service": "FitBot API - AI Fitness Assistant",
         "version": "2.0",
@@ -425,12 +2022,19 @@ async def root():
             "Conversational AI Interface"
         ],
         "endpoints": {
-            "health": "GET /health - Health check",
+            "health": "GET /health - Health check (liveness)",
+            "ready": "GET /ready - Readiness: 503 until Groq, TTS, STT and the FAQ index are loaded",
             "chat": "POST /chat - AI fitness chat",
+            "chat_stream": "POST /chat/stream - AI fitness chat streamed as Server-Sent Events",
+            "chat_batch": "POST /chat/batch - Many chat turns at once, results streamed as NDJSON",
+            "chat_session": "DELETE /chat/session/{user_id} - Clear server-side chat history",
             "tutorials": "GET /tutorials - List all exercises",
             "tutorial_by_exercise": "GET /tutorials/{exercise} - Get specific exercise tutorials",
             "tts": "POST /tts - Text to speech",
-            "stt": "POST /stt - Speech to text"
+            "tts_stream": "POST /tts/stream - Text to speech, streamed sentence by sentence",
+            "stt": "POST /stt - Speech to text",
+            "voice_chat": "POST /voice-chat - Audio in, transcript + reply + streamed audio out (SSE)",
+            "metrics": "GET /metrics - Prometheus metrics"
         },
         "documentation": "/docs",
         "note": "This is an API-only service. Connect your frontend to these endpoints."
@@ -440,170 +2044,1438 @@ async def root():
 async def ping():
     return {"message": "pong", "service": "FitBot Fitness Assistant"}
 
-# ==================== CHAT ENDPOINT ====================
-@app.post("/chat")
-async def chat(request: ChatRequest):
+# ==================== USER PROFILE & PHASE ====================
+PHASE_AWARE_PROMPT = os.getenv("PHASE_AWARE_PROMPT", "1") != "0"
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+
+PROFILE_SLOTS = ("goal", "location", "days", "injuries", "experience")
+
+SLOT_LABELS = {
+    "goal": "Goal",
+    "location": "Training location",
+    "days": "Days per week",
+    "injuries": "Injuries/limitations",
+    "experience": "Experience level",
+}
+
+# Question FitBot asks to fill each slot (from the PHASE 1/2 script)
+SLOT_QUESTIONS = {
+    "goal": "Are you looking to lose weight, build muscle, or improve your athletic performance?",
+    "location": "Where will you be working out - do you have a gym membership or will you be training at home?",
+    "days": "How many days per week can you realistically commit to working out?",
+    "injuries": "Do you have any injuries or physical limitations I should know about?",
+    "experience": "What's your current experience level: beginner, intermediate, or have you been training for a while?",
+}
+
+# Keywords in FitBot's last question that tell us which slot the user is answering
+SLOT_QUESTION_PATTERNS = {
+    "goal": re.compile(r"\b(goal|lose weight|build muscle|brings you here)\b", re.I),
+    "location": re.compile(r"\b(gym|at home|working out from|train(ing)? at)\b", re.I),
+    "days": re.compile(r"\bdays? (per|a) week\b|\bhow many days\b", re.I),
+    "injuries": re.compile(r"\b(injur\w*|limitations?)\b", re.I),
+    "experience": re.compile(r"\b(experience|beginner|worked out before)\b", re.I),
+}
+
+GOAL_PATTERNS = (
+    ("athletic performance", re.compile(r"\b(athletic|performance|sports?|endurance|speed|stamina|agility)\b", re.I)),
+    ("muscle gain", re.compile(r"\b(muscles?|bulk\w*|gain\w*|strength|stronger)\b", re.I)),
+    ("weight loss", re.compile(r"\b(lose|losing|loss|fat|slim\w*|lean\w*|cut(ting)?)\b", re.I)),
+)
+LOCATION_PATTERNS = (
+    ("gym", re.compile(r"\bgym\b", re.I)),
+    ("home", re.compile(r"\b(home|house|apartment|outdoors?)\b", re.I)),
+)
+EXPERIENCE_PATTERNS = (
+    ("beginner", re.compile(r"\b(beginner|new to|never|first time|just start\w*|complete newbie)\b", re.I)),
+    ("intermediate", re.compile(r"\bintermediate\b", re.I)),
+    ("advanced", re.compile(r"\b(advanced|experienced|years|a while|long time)\b", re.I)),
+)
+NUMBER_WORDS = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7}
+DAYS_PATTERN = re.compile(r"\b([1-7]|one|two|three|four|five|six|seven)\s*(days?|x|times)\b", re.I)
+BARE_NUMBER_PATTERN = re.compile(r"^\s*([1-7]|one|two|three|four|five|six|seven)\s*[.!]?\s*$", re.I)
+NO_INJURY_PATTERN = re.compile(
+    r"^\s*(no|nope|nah|none|nothing|not really|i'?m good|all good)\b|\bno (injur\w*|limitations?|problems?|issues?)\b",
+    re.I,
+)
+INJURY_PATTERN = re.compile(r"\b(injur\w*|hurt\w*|pain\w*|sore|surgery|bad (knee|back|shoulder|ankle|wrist)s?)\b", re.I)
+PLAN_GIVEN_PATTERN = re.compile(r"\bday 1\b", re.I)
+PLAN_REQUEST_PATTERN = re.compile(r"\b(plan|routine|program|schedule)\b", re.I)
+
+# user_id -> (messages seen, slots)
+user_profiles = make_cache("profiles", PROFILE_CACHE_SIZE, SESSION_TTL_SECONDS)
+
+def match_first(patterns, text: str):
+    """Return the label of the first pattern that matches text"""
+    for label, pattern in patterns:
+        if pattern.search(text):
+            return label
+    return None
+
+def asked_slot(assistant_text: str):
+    """Which profile slot FitBot's last question was about, if any"""
+    questions = [q for q in re.split(r"(?<=[.!?])\s+", assistant_text) if q.endswith("?")]
+    # Last question wins; skip trailing fillers like "3 days? 4 days? More?"
+    for question in reversed(questions):
+        for slot, pattern in SLOT_QUESTION_PATTERNS.items():
+            if pattern.search(question):
+                return slot
+    return None
+
+def extract_slots(slots: dict, assistant_text: str, user_text: str):
+    """Update slots in place from one user answer and the question before it"""
+    asked = asked_slot(assistant_text) if assistant_text else None
+
+    def settable(slot):
+        # Side remarks only fill gaps; a direct answer may overwrite
+        return slot not in slots or asked == slot
+
+    goal = match_first(GOAL_PATTERNS, user_text)
+    if goal and settable("goal"):
+        slots["goal"] = goal
+
+    location = match_first(LOCATION_PATTERNS, user_text)
+    if location and settable("location"):
+        slots["location"] = location
+
+    days = DAYS_PATTERN.search(user_text)
+    if not days and asked == "days":
+        days = BARE_NUMBER_PATTERN.search(user_text)
+    if days and settable("days"):
+        value = days.group(1).lower()
+        slots["days"] = NUMBER_WORDS.get(value) or int(value)
+
+    if asked == "injuries" and NO_INJURY_PATTERN.search(user_text):
+        slots["injuries"] = "none"
+    elif INJURY_PATTERN.search(user_text) and not NO_INJURY_PATTERN.search(user_text):
+        slots["injuries"] = user_text.strip()[:120]
+
+    experience = match_first(EXPERIENCE_PATTERNS, user_text)
+    if experience and settable("experience") and (asked == "experience" or experience != "advanced"):
+        slots["experience"] = experience
+
+    # Answer to a direct question that no pattern recognised: keep the user's words
+    if asked in PROFILE_SLOTS and asked not in slots and user_text.strip():
+        slots[asked] = user_text.strip()[:120]
+
+def update_profile(user_id: str, chat_history: list, user_message: str) -> dict:
+    """
+    Extract profile slots from the conversation and remember them per user.
+
+    Only messages not seen on earlier turns are scanned. Facts stay known even
+    after the history that mentioned them is summarized or trimmed. When the
+    scanned prefix no longer matches (a client sending only its last few
+    messages), the whole history is rescanned.
+    """
+    if not chat_history:
+        user_profiles.pop(user_id)
+    seen, digest, slots = user_profiles.get(user_id) or (0, "", {})
+    slots = dict(slots)
+    start = seen if seen <= len(chat_history) and history_digest(chat_history[:seen]) == digest else 0
+
+    previous = chat_history[start - 1]["content"] if start and chat_history[start - 1]["role"] == "assistant" else ""
+    for msg in chat_history[start:]:
+        if msg["role"] == "assistant":
+            if PLAN_GIVEN_PATTERN.search(msg["content"]):
+                slots["plan_given"] = True
+            previous = msg["content"]
+        elif msg["role"] == "user":
+            extract_slots(slots, previous, msg["content"])
+            previous = ""
+
+    user_profiles.set(user_id, (len(chat_history), history_digest(chat_history), slots))
+
+    # The new message is folded in for this turn only; it is rescanned with its reply next turn
+    current = dict(slots)
+    extract_slots(current, previous, user_message)
+    return current
+
+def conversation_phase(slots: dict, chat_history: list, user_message: str) -> str:
+    """greeting, questioning or plan"""
+    if slots.get("plan_given") or all(slot in slots for slot in PROFILE_SLOTS):
+        return "plan"
+    if PLAN_REQUEST_PATTERN.search(user_message) and "goal" in slots:
+        return "plan"
+    if not chat_history and not any(slot in slots for slot in PROFILE_SLOTS):
+        return "greeting"
+    return "questioning"
+
+def build_system_prompt(slots: dict, phase: str) -> str:
+    """Assemble only the prompt sections the current phase needs, plus a slot summary"""
+    if not PHASE_AWARE_PROMPT:
+        return TRAINER_SYSTEM_PROMPT
+
+    sections = [PROMPT_CORE, PROMPT_FLOW_HEADER]
+    if phase == "greeting":
+        sections.append(PROMPT_GREETING)
+    elif phase == "questioning":
+        sections.append(PROMPT_QUESTIONING)
+    else:
+        sections.append(PROMPT_PLAN)
+
+    known = [f"- {SLOT_LABELS[slot]}: {slots[slot]}" for slot in PROFILE_SLOTS if slot in slots]
+    if known:
+        sections.append("\nWHAT YOU ALREADY KNOW (don't ask again):\n" + "\n".join(known) + "\n")
+
+    missing = [slot for slot in PROFILE_SLOTS if slot not in slots]
+    if phase == "questioning" and missing:
+        sections.append(f'\nNEXT: acknowledge their answer, then ask only this: "{SLOT_QUESTIONS[missing[0]]}"\n')
+    elif phase == "plan" and missing and not slots.get("plan_given"):
+        sections.append("\nNot known yet (assume sensible defaults): " + ", ".join(SLOT_LABELS[s] for s in missing) + "\n")
+
+    return "".join(sections)
+
+# ==================== CONTEXT ASSEMBLY ====================
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "llama-3.1-8b-instant")
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "10000"))
+
+SUMMARY_PROMPT = """
+Summarize the earlier part of a conversation between FitBot (a fitness coach) and a user.
+Always keep every fact the user gave: goal, gym or home, days per week, injuries or
+limitations, experience level. If a workout plan was already given, list its days and
+exercises in one short line. Plain text, under 120 words.
+"""
+
+# user_id -> (folded_count, digest of folded messages, summary)
+summary_cache = make_cache("summaries", SUMMARY_CACHE_SIZE, SESSION_TTL_SECONDS)
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English)"""
+    return len(text) // 4 + 1
+
+def history_digest(messages: list) -> str:
+    """Stable fingerprint of a list of chat messages"""
+    return hashlib.sha1(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+
+async def summarize_messages(previous_summary: str, messages: list, priority: int = PRIORITY_INTERACTIVE) -> str:
+    """Fold messages into the rolling summary with a cheap model, admitted at the turn's priority"""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    if previous_summary:
+        transcript = f"Summary so far: {previous_summary}\n\n{transcript}"
     try:
-        if not groq_client:
-            raise HTTPException(status_code=503, detail="Groq Client not initialized. Check API Key.")
+        completion = await create_chat_completion(
+            [
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": transcript},
+            ],
+            model=SUMMARY_MODEL,
+            priority=priority,
+            temperature=0,
+            max_tokens=200,
+        )
+        return completion.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"Summary Error: {e}")
+        # Fall back to the user's own words, which carry the profile facts
+        user_words = " | ".join(m["content"] for m in messages if m["role"] == "user")
+        return f"{previous_summary} | {user_words}".strip(" |")[-2000:]
+
+async def fold_history(user_id: str, history: list, priority: int = PRIORITY_INTERACTIVE) -> tuple:
+    """
+    Split history into (summary, recent messages) so recent fits HISTORY_TOKEN_BUDGET.
+
+    The fold point only moves forward, and only when the budget overflows, so the
+    summary is computed once per step and reused from summary_cache on later turns.
+    """
+    folded_count, summary = 0, ""
+    cached = summary_cache.get(user_id)
+    if cached and cached[0] <= len(history) and history_digest(history[:cached[0]]) == cached[1]:
+        folded_count, _, summary = cached
+
+    recent = history[folded_count:]
+    if sum(estimate_tokens(m["content"]) for m in recent) <= HISTORY_TOKEN_BUDGET:
+        return summary, recent
+
+    # Keep at most half the budget verbatim so the next few turns fit without refolding
+    keep, used = 0, 0
+    for msg in reversed(recent):
+        used += estimate_tokens(msg["content"])
+        if used > HISTORY_TOKEN_BUDGET // 2:
+            break
+        keep += 1
+
+    split = len(recent) - keep
+    summary = await summarize_messages(summary, recent[:split], priority)
+    folded_count += split
+    summary_cache.set(user_id, (folded_count, history_digest(history[:folded_count]), summary))
+    return summary, recent[split:]
+
+async def build_chat_messages(
+    user_id: str, history: list, user_message: str, system_prompt: str, priority: int = PRIORITY_INTERACTIVE
+) -> list:
+    """Build the Groq message list from the system prompt, history and new message"""
+    messages = [{"role": "system", "content": system_prompt}]
+
+    summary, recent = await fold_history(user_id, history, priority)
+    if summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation: {summary}"})
+    messages.extend(recent)
+
+    # Add current user message
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+# ==================== PLAN CACHE ====================
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "1000"))
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+PLAN_PERSONALIZE = os.getenv("PLAN_PERSONALIZE", "0") == "1"
+PERSONALIZE_MODEL = os.getenv("PERSONALIZE_MODEL", "llama-3.1-8b-instant")
+
+PERSONALIZE_PROMPT = """
+You are FitBot, a friendly fitness coach. Write ONE short, upbeat sentence (max 25 words)
+to say right before handing the user their workout plan. Refer to what they just said if
+it fits. No emojis, no plan details.
+"""
+
+# (goal, location, days, experience) -> plan reply; only for users with no injuries
+plan_cache = make_cache("plans", PLAN_CACHE_SIZE, PLAN_CACHE_TTL_SECONDS)
+
+def plan_cache_key(slots: dict, phase: str):
+    """Normalized profile tuple when this turn generates a cacheable plan, else None"""
+    if phase != "plan" or slots.get("plan_given") or slots.get("injuries") != "none":
+        return None
+    key = (slots.get("goal"), slots.get("location"), slots.get("days"), slots.get("experience"))
+    if (
+        key[0] not in {label for label, _ in GOAL_PATTERNS}
+        or key[1] not in {label for label, _ in LOCATION_PATTERNS}
+        or not isinstance(key[2], int)
+        or key[3] not in {label for label, _ in EXPERIENCE_PATTERNS}
+    ):
+        return None
+    return key
+
+def store_plan(key, reply_text: str):
+    """Cache a freshly generated plan reply"""
+    if key and PLAN_GIVEN_PATTERN.search(reply_text):
+        plan_cache.set(key, reply_text)
+
+async def personalize_plan(plan: str, user_message: str, priority: int = PRIORITY_INTERACTIVE) -> str:
+    """Optionally prepend a short personalized intro from a cheap model"""
+    if not PLAN_PERSONALIZE:
+        return plan
+    try:
+        completion = await create_chat_completion(
+            [
+                {"role": "system", "content": PERSONALIZE_PROMPT},
+                {"role": "user", "content": user_message},
+            ],
+            model=PERSONALIZE_MODEL,
+            priority=priority,
+            temperature=0.7,
+            max_tokens=60,
+        )
+        return completion.choices[0].message.content.strip() + "\n\n" + plan
+    except Exception as e:
+        print(f"Personalize Error: {e}")
+        return plan
+
+# ==================== FAQ CACHE ====================
+# Standalone questions ("how much water should I drink?", off-topic asks) asked in
+# other words are answered from earlier replies instead of a new Groq call.
+FAQ_CACHE_SIZE = int(os.getenv("FAQ_CACHE_SIZE", "1000"))  # 0 = off
+FAQ_CACHE_THRESHOLD = float(os.getenv("FAQ_CACHE_THRESHOLD", "0.85"))  # cosine similarity needed for a hit
+FAQ_CACHE_TTL_SECONDS = float(os.getenv("FAQ_CACHE_TTL_SECONDS", str(24 * 3600)))
+FAQ_VECTOR_DIM = 2048  # hashed feature space; 1000 entries take 8 MB
+
+FAQ_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+# Words that don't change what is being asked; "not", "before", "after" etc. do, so they are absent
+FAQ_STOPWORDS = frozenset("""
+    a an the i im me my you your we is are am be been it its this that there here to of for in on at by
+    with and or so do does did can could should would will shall how what whats when where which who why
+    much many some any per just really please ok okay up out
+""".split())
+
+def faq_words(question: str) -> list:
+    return FAQ_WORD_PATTERN.findall(question.lower().replace("'", ""))
+
+def faq_content_words(question: str) -> tuple:
+    return tuple(word for word in faq_words(question) if word not in FAQ_STOPWORDS)
+
+def same_content_words(a: tuple, b: tuple) -> bool:
+    """
+    Same content words in the same order, a word matching its inflections
+    ("run"/"running"). Similar vectors alone let "gain weight" answer "lose
+    weight" and "cardio before weights" answer "weights before cardio".
+    """
+    return len(a) == len(b) and all(
+        x == y or (min(len(x), len(y)) >= 3 and (x.startswith(y) or y.startswith(x))) for x, y in zip(a, b)
+    )
 
-        user_id = request.user_id
-        user_message = request.message.strip()
-        
+def faq_features(question: str) -> list:
+    """Hashed word and character-trigram features; trigrams absorb typos and word forms"""
+    words = faq_words(question)
+    padded = " " + " ".join(words) + " "
+    grams = ["w:" + word for word in words] + [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return [zlib.crc32(gram.encode()) & (FAQ_VECTOR_DIM - 1) for gram in grams]
+
+class FAQCache:
+    """
+    Bounded answer cache searched by TF-IDF cosine similarity.
+
+    Questions are rows of one preallocated NumPy matrix, so a lookup is a
+    single matrix-vector product. IDF weights follow the questions currently
+    cached. A match above the threshold must also ask about the same content
+    words (same_content_words). Entries expire after ttl_seconds; when full, the least recently
+    used one is replaced. Runs on the event loop only, so it needs no lock.
+    """
+
+    def __init__(self, max_size: int, threshold: float, ttl_seconds: float):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self._vectors = None  # (max_size, FAQ_VECTOR_DIM) term weights, allocated on first add
+        self._df = None  # cached questions containing each feature
+        self._norms = None  # TF-IDF row norms, rebuilt after the index changes
+        self._expires = None
+        self._used = None
+        self._active = None
+        self._answers = [None] * max_size  # (content words, answer) per row
+        self._rows = 0  # rows ever filled; free rows come back via _active
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lookup_seconds = 0.0
+
+    def __len__(self):
+        return int(self._active.sum()) if self._active is not None else 0
+
+    def _vector(self, question: str):
+        np = faq_service.value
+        counts = np.bincount(faq_features(question), minlength=FAQ_VECTOR_DIM)
+        return np.log1p(counts, dtype=np.float32)  # sublinear term frequency
+
+    def _idf(self):
+        np = faq_service.value
+        # float32 throughout: a float64 operand would upcast the whole matrix on every lookup
+        return (np.log((1 + len(self)) / (1 + self._df)) + 1).astype(np.float32)
+
+    def _remove(self, row: int):
+        self._df -= self._vectors[row] > 0
+        self._vectors[row] = 0
+        self._active[row] = False
+        self._answers[row] = None
+        self._norms = None
+
+    def _expire(self, now: float):
+        for row in (self._active[:self._rows] & (self._expires[:self._rows] <= now)).nonzero()[0]:
+            self._remove(row)
+
+    def lookup(self, question: str) -> Optional[str]:
+        """The cached answer to the most similar question, if it is similar enough"""
+        np = faq_service.value
+        start = time.perf_counter()
+        answer = None
+        if self._vectors is not None:
+            self._expire(time.monotonic())
+            if len(self):
+                idf = self._idf()
+                rows = self._vectors[:self._rows]
+                if self._norms is None:
+                    self._norms = np.sqrt((rows * rows) @ (idf * idf))
+                    self._norms[self._norms == 0] = 1
+                query = self._vector(question) * idf
+                query_norm = np.linalg.norm(query)
+                if query_norm:
+                    scores = (rows @ (query * idf)) / (self._norms * query_norm)
+                    words = faq_content_words(question)
+                    # Best first among the similar enough; the first asking the same thing wins
+                    for row in sorted((scores >= self.threshold).nonzero()[0], key=scores.__getitem__, reverse=True):
+                        if self._active[row] and same_content_words(words, self._answers[row][0]):
+                            self._used[row] = time.monotonic()
+                            answer = self._answers[row][1]
+                            break
+        elapsed = time.perf_counter() - start
+        self._lookup_seconds += elapsed
+        faq_lookup_seconds.observe(elapsed)
+        if answer is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return answer
+
+    def add(self, question: str, answer: str):
+        np = faq_service.value
+        if self._vectors is None:
+            self._vectors = np.zeros((self.max_size, FAQ_VECTOR_DIM), dtype=np.float32)
+            self._df = np.zeros(FAQ_VECTOR_DIM, dtype=np.int64)
+            self._expires = np.zeros(self.max_size)
+            self._used = np.zeros(self.max_size)
+            self._active = np.zeros(self.max_size, dtype=bool)
+
+        now = time.monotonic()
+        self._expire(now)
+        free = (~self._active[:self._rows]).nonzero()[0]
+        if len(free):
+            row = int(free[0])
+        elif self._rows < self.max_size:
+            row = self._rows
+            self._rows += 1
+        else:
+            row = int(np.argmin(self._used))
+            self._remove(row)
+            self.evictions += 1
+
+        vector = self._vector(question)
+        self._vectors[row] = vector
+        self._df += vector > 0
+        self._active[row] = True
+        self._answers[row] = (faq_content_words(question), answer)
+        self._expires[row] = now + self.ttl_seconds
+        self._used[row] = now
+        self._norms = None
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "avg_lookup_ms": round(self._lookup_seconds / lookups * 1000, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+faq_cache = FAQCache(FAQ_CACHE_SIZE, FAQ_CACHE_THRESHOLD, FAQ_CACHE_TTL_SECONDS)
+
+def is_standalone_turn(history: list, slots: dict) -> bool:
+    """
+    True when the reply can't depend on who asks: no earlier turns and no
+    profile facts, so Groq sees the same prompt for everyone.
+    """
+    return bool(FAQ_CACHE_SIZE) and not history and not slots
+
+async def cached_reply(turn: dict) -> Optional[str]:
+    """A reply from the plan or FAQ cache, or None when Groq has to answer"""
+    if turn["plan_key"]:
+        cached_plan = plan_cache.get(turn["plan_key"])
+        if cached_plan:
+            return await personalize_plan(cached_plan, turn["user_message"], turn["priority"])
+    if turn["standalone"] and await faq_service.aget() is not None:
+        return faq_cache.lookup(turn["user_message"])
+    return None
+
+def store_reply(turn: dict, reply_text: str):
+    """Remember a fresh Groq reply in whichever cache the turn qualifies for"""
+    store_plan(turn["plan_key"], reply_text)
+    if turn["standalone"] and reply_text and faq_service.value is not None:
+        faq_cache.add(turn["user_message"], reply_text)
+
+# ==================== MODEL ROUTING ====================
+LARGE_MODEL = os.getenv("LARGE_MODEL", "llama-3.3-70b-versatile")
+SMALL_MODEL = os.getenv("SMALL_MODEL", "llama-3.1-8b-instant")
+LARGE_MODEL_TIMEOUT = float(os.getenv("LARGE_MODEL_TIMEOUT", "30"))
+SMALL_MODEL_TIMEOUT = float(os.getenv("SMALL_MODEL_TIMEOUT", "8"))
+MODEL_ROUTING = os.getenv("MODEL_ROUTING", "1") != "0"  # 0 = always use LARGE_MODEL
+
+# Timeout per model; for streams it bounds the wait for the first token
+MODEL_TIMEOUTS = {LARGE_MODEL: LARGE_MODEL_TIMEOUT, SMALL_MODEL: SMALL_MODEL_TIMEOUT}
+
+routing_decisions = {"small": 0, "large": 0, "fallbacks": 0}
+model_stats = {}  # model -> {"calls", "errors", "timeouts", "latencies"}
+
+def route_models(phase: str) -> list:
+    """Models to try for this turn, primary first: small for chat, large for plans"""
+    if not MODEL_ROUTING or phase == "plan":
+        routing_decisions["large"] += 1
+        return [LARGE_MODEL, SMALL_MODEL]
+    routing_decisions["small"] += 1
+    return [SMALL_MODEL, LARGE_MODEL]
+
+def record_model_call(model: str, seconds: float = None, error: Exception = None):
+    """Track per-model latency and failures"""
+    stats = model_stats.setdefault(
+        model, {"calls": 0, "errors": 0, "timeouts": 0, "latencies": deque(maxlen=1000)}
+    )
+    stats["calls"] += 1
+    if isinstance(error, asyncio.TimeoutError):
+        stats["timeouts"] += 1
+    elif error is not None:
+        stats["errors"] += 1
+    else:
+        stats["latencies"].append(seconds)
+
+def routing_report() -> dict:
+    """Routing decisions and per-model latency percentiles"""
+    models = {}
+    for model, stats in model_stats.items():
+        latencies = sorted(stats["latencies"])
+        models[model] = {
+            "calls": stats["calls"],
+            "errors": stats["errors"],
+            "timeouts": stats["timeouts"],
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+        }
+    return {"enabled": MODEL_ROUTING, "decisions": dict(routing_decisions), "models": models}
+
+async def routed_completion(messages: list, phase: str, **kwargs):
+    """Complete with the routed model, falling back to the other one on timeout or error"""
+    last_error = None
+    for attempt, model in enumerate(route_models(phase)):
+        if attempt:
+            routing_decisions["fallbacks"] += 1
+        try:
+            return await create_chat_completion(
+                messages, model=model, timeout=MODEL_TIMEOUTS.get(model, GROQ_TIMEOUT), **kwargs
+            )
+        except HTTPException:
+            raise  # admission rejected; the other model shares the same queue
+        except Exception as e:
+            print(f"Groq API Error ({model}): {e!r}")
+            last_error = e
+    raise last_error
+
+async def routed_stream(messages: list, phase: str, **kwargs):
+    """Stream from the routed model; falls back only if the first token is late or fails"""
+    last_error = None
+    for attempt, model in enumerate(route_models(phase)):
+        if attempt:
+            routing_decisions["fallbacks"] += 1
+        stream = stream_chat_completion(
+            messages, first_token_timeout=MODEL_TIMEOUTS.get(model, GROQ_TIMEOUT), model=model, **kwargs
+        )
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = ""
+        except HTTPException:
+            await stream.aclose()
+            raise
+        except Exception as e:
+            print(f"Groq API Error ({model}): {e!r}")
+            await stream.aclose()
+            last_error = e
+            continue
+
+        # Past the first token there is no fallback; errors surface to the caller
+        yield first
+        async for delta in stream:
+            yield delta
+        return
+    raise last_error
+
+# ==================== CHAT ENDPOINT ====================
+CHAT_COMPLETION_PARAMS = {
+    "temperature": 0.7,
+    "max_tokens": 1500,
+}
+
+async def load_chat_history(request: ChatRequest) -> list:
+    """Resolve the history for this turn from the client or the session store"""
+    if not request.session:
         # Use chat history from client (they manage their own state)
-        chat_history = request.chat_history if request.chat_history else []
-        
-        # Prepare messages for Groq
-        messages = [{"role": "system", "content": TRAINER_SYSTEM_PROMPT}]
-        
-        # Add recent chat history (last 10 messages for context)
-        for msg in chat_history[-10:]:
-            if "role" in msg and "content" in msg:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-        
-        # Add current user message
-        messages.append({"role": "user", "content": user_message})
-        
+        return request.chat_history if request.chat_history else []
+
+    history = await chat_sessions.aget(request.user_id)
+    if not history and request.chat_history:
+        # Seed a new session from a client that is switching over mid-conversation
+        history = await chat_sessions.aappend(request.user_id, list(request.chat_history))
+    return history
+
+async def build_chat_response(request: ChatRequest, chat_history: list, user_message: str, reply_text: str) -> dict:
+    """Build the /chat response body for a completed turn"""
+    # Find relevant YouTube tutorials based on AI response and user message
+    tutorials = find_relevant_tutorials(reply_text + " " + user_message)
+
+    new_turn = [
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": reply_text}
+    ]
+
+    # Session mode: history stays on the server, only the new turn goes back
+    if request.session:
+        stored_history = await chat_sessions.aappend(request.user_id, new_turn)
+        return {
+            "reply": reply_text,
+            "tutorials": tutorials,
+            "message_count": len(stored_history)
+        }
+
+    # Build updated history
+    updated_history = chat_history + new_turn
+
+    if not request.return_history:
+        return {
+            "reply": reply_text,
+            "tutorials": tutorials,
+            "new_messages": new_turn,
+            "message_count": len(updated_history)
+        }
+
+    return {
+        "reply": reply_text,
+        "tutorials": tutorials,
+        "chat_history": updated_history,
+        "message_count": len(updated_history)
+    }
+
+async def prepare_chat_turn(request: ChatRequest, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """Resolve history, profile slots, phase and Groq messages for one turn"""
+    user_message = request.message.strip()
+    chat_history = await load_chat_history(request)
+    history = [
+        {"role": msg["role"], "content": msg["content"]}
+        for msg in chat_history
+        if "role" in msg and "content" in msg
+    ]
+    slots = update_profile(request.user_id, history, user_message)
+    phase = conversation_phase(slots, history, user_message)
+    messages = await build_chat_messages(
+        request.user_id, history, user_message, build_system_prompt(slots, phase), priority
+    )
+    return {
+        "user_message": user_message,
+        "chat_history": chat_history,
+        "slots": slots,
+        "phase": phase,
+        "messages": messages,
+        "plan_key": plan_cache_key(slots, phase),
+        "standalone": is_standalone_turn(history, slots),
+        "priority": priority,  # summaries and plan intros run on this turn's critical path
+    }
+
+async def complete_chat_turn(request: ChatRequest, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """Run one non-streamed chat turn and return the /chat response body"""
+    # Prepare messages for Groq
+    turn = await prepare_chat_turn(request, priority)
+
+    # Plans for a common profile and standalone questions are served from cache
+    reply_text = await cached_reply(turn)
+    if reply_text is None:
         # Call Groq AI
         try:
-            completion = groq_client.chat.completions.create(
-                messages=messages,
-                model="llama-3.3-70b-versatile",
-                temperature=0.7,
-                max_tokens=1500,
+            completion = await routed_completion(
+                turn["messages"], turn["phase"], priority=priority, **CHAT_COMPLETION_PARAMS
             )
             reply_text = completion.choices[0].message.content.strip()
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"Groq API Error: {e}")
             raise HTTPException(status_code=502, detail=f"Groq API Error: {str(e)}")
-        
-        # Find relevant YouTube tutorials based on AI response and user message
-        tutorials = find_relevant_tutorials(reply_text + " " + user_message)
-        
-        # Build updated history
-        updated_history = chat_history + [
-            {"role": "user", "content": user_message},
-            {"role": "assistant", "content": reply_text}
-        ]
-        
-        return JSONResponse({
-            "reply": reply_text,
-            "tutorials": tutorials,
-            "chat_history": updated_history,
-            "message_count": len(updated_history)
-        })
-    
+        store_reply(turn, reply_text)
+
+    return await build_chat_response(request, turn["chat_history"], turn["user_message"], reply_text)
+
+@app.post("/chat")
+async def chat(request: ChatRequest):
+    try:
+        if not await get_groq_client():
+            raise HTTPException(status_code=503, detail="Groq Client not initialized. Check API Key.")
+        enforce_rate_limit(request.user_id)
+        return FastJSONResponse(await complete_chat_turn(request))
+
     except HTTPException as he:
         raise he
     except Exception as e:
         print(f"Error in /chat: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.delete("/chat/session/{user_id}")
+async def clear_chat_session(user_id: str):
+    """Forget the server-side history for a user"""
+    await chat_sessions.aclear(user_id)
+    summary_cache.pop(user_id)
+    user_profiles.pop(user_id)
+    return FastJSONResponse({"user_id": user_id, "cleared": True})
+
+# ==================== STREAMING CHAT ENDPOINT ====================
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {encode_json(data).decode()}\n\n"
+
+async def chat_turn_events(request: ChatRequest, turn: dict):
+    """
+    Run one streamed chat turn, yielding (event, data) pairs.
+
+    Events: `token` (text delta), `tutorial` (emitted as soon as an exercise
+    name appears in the text), then `done` (same body as /chat) or `error`.
+    """
+    cached = await cached_reply(turn)
+
+    async def cached_deltas():
+        yield cached
+
+    reply_text = ""
+    emitted = set()
+    # Only rescan the tail that could contain a newly completed exercise name
+    window = get_tutorial_catalog().matcher.max_phrase_chars
+    if cached is not None:
+        deltas = cached_deltas()
+    else:
+        deltas = routed_stream(turn["messages"], turn["phase"], **CHAT_COMPLETION_PARAMS)
+    try:
+        async for delta in deltas:
+            reply_text += delta
+            yield "token", {"text": delta}
+
+            # Start the tail on a word boundary so a cut word can't match ("th|rows")
+            tail_start = max(0, len(reply_text) - len(delta) - window)
+            while 0 < tail_start < len(reply_text) and reply_text[tail_start - 1].isalnum():
+                tail_start += 1
+            for tutorial in find_relevant_tutorials(reply_text[tail_start:]):
+                if tutorial["exercise"] not in emitted:
+                    emitted.add(tutorial["exercise"])
+                    yield "tutorial", tutorial
+    except HTTPException as e:
+        yield "error", {"detail": e.detail, "status_code": e.status_code}
+        return
+    except Exception as e:
+        print(f"Groq API Error: {e}")
+        yield "error", {"detail": f"Groq API Error: {str(e)}"}
+        return
+
+    reply_text = reply_text.strip()
+    if cached is None:
+        store_reply(turn, reply_text)
+    yield "done", await build_chat_response(request, turn["chat_history"], turn["user_message"], reply_text)
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Stream the reply as Server-Sent Events.
+
+    Events: `token` (text delta), `tutorial` (emitted as soon as an exercise
+    name appears in the text), `done` (same body as /chat) and `error`.
+    """
+    if not await get_groq_client():
+        raise HTTPException(status_code=503, detail="Groq Client not initialized. Check API Key.")
+    enforce_rate_limit(request.user_id)
+    groq_admission.check()  # fail fast while a real status code can still be sent
+
+    turn = await prepare_chat_turn(request)
+
+    async def event_stream():
+        async for event, data in chat_turn_events(request, turn):
+            yield sse_event(event, data)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ==================== BATCH CHAT ENDPOINT ====================
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "10000"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "32"))
+BATCH_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", "120"))
+
+async def run_batch_item(index: int, item: ChatRequest, timeout: float) -> dict:
+    """One batch item as an NDJSON record; failures are reported, never raised"""
+    record = {"index": index, "user_id": item.user_id}
+    try:
+        async with asyncio.timeout(timeout):
+            while True:
+                try:
+                    # Bulk priority: interactive /chat traffic is served first
+                    record["response"] = await complete_chat_turn(item, PRIORITY_BULK)
+                    break
+                except HTTPException as e:
+                    if e.status_code != 429:
+                        raise
+                    # Queue full: back off as told instead of failing the item
+                    await asyncio.sleep(float(e.headers["Retry-After"]))
+        record["status"] = 200
+    except TimeoutError:
+        record["status"] = 504
+        record["error"] = f"Timed out after {timeout:g}s"
+    except HTTPException as e:
+        record["status"] = e.status_code
+        record["error"] = e.detail
+    except Exception as e:
+        print(f"Error in /chat/batch item {index}: {e}")
+        record["status"] = 500
+        record["error"] = str(e)
+    return record
+
+@app.post("/chat/batch")
+async def chat_batch(batch: BatchChatRequest, request: Request):
+    """
+    Run many chat turns concurrently, streaming results as NDJSON.
+
+    One line per item in completion order: {"index", "user_id", "status",
+    "response" | "error"}, where response is the /chat body. A final
+    {"summary": ...} line reports totals. Items run at bulk priority with at
+    most `parallelism` in flight, each bounded by `timeout_seconds`.
+    """
+    if not await get_groq_client():
+        raise HTTPException(status_code=503, detail="Groq Client not initialized. Check API Key.")
+    enforce_rate_limit(client_key(request))
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    if batch.parallelism is not None and batch.parallelism <= 0:
+        raise HTTPException(status_code=400, detail="parallelism must be positive")
+    if batch.timeout_seconds is not None and not batch.timeout_seconds > 0:
+        raise HTTPException(status_code=400, detail="timeout_seconds must be positive")
+    parallelism = min(batch.parallelism or BATCH_MAX_PARALLELISM, BATCH_MAX_PARALLELISM)
+    timeout = batch.timeout_seconds if batch.timeout_seconds is not None else BATCH_ITEM_TIMEOUT
+
+    async def results():
+        start = time.perf_counter()
+        pending = iter(enumerate(batch.items))
+        done = asyncio.Queue()
+
+        async def worker():
+            for index, item in pending:
+                await done.put(await run_batch_item(index, item, timeout))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(parallelism, len(batch.items)))]
+        failed = 0
+        try:
+            for _ in range(len(batch.items)):
+                record = await done.get()
+                failed += record["status"] != 200
+                yield encode_json(record) + b"\n"
+        finally:
+            for task in workers:
+                task.cancel()
+        yield encode_json({"summary": {
+            "total": len(batch.items),
+            "succeeded": len(batch.items) - failed,
+            "failed": failed,
+            "elapsed_s": round(time.perf_counter() - start, 3),
+        }}) + b"\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
 # ==================== EXERCISE TUTORIALS ENDPOINT ====================
+def catalog_response(request: Request, status: int, body: bytes, etag: str) -> Response:
+    """Serve a precomputed catalog body, answering 304 when the client's copy is current"""
+    headers = {"ETag": etag, "Cache-Control": TUTORIALS_CACHE_CONTROL}
+    client_etags = request.headers.get("if-none-match", "")
+    if status == 200 and client_etags:
+        tags = {tag.strip().removeprefix("W/") for tag in client_etags.split(",")}
+        if etag in tags or "*" in tags:
+            return Response(status_code=304, headers=headers)
+    return Response(content=body, status_code=status, media_type="application/json", headers=headers)
+
 @app.get("/tutorials/{exercise}")
-async def get_exercise_tutorials(exercise: str):
+async def get_exercise_tutorials(exercise: str, request: Request):
     """Get YouTube tutorials for a specific exercise"""
     try:
-        exercise_lower = exercise.lower().strip()
-        
-        # Direct match
-        if exercise_lower in YOUTUBE_TUTORIALS:
-            return JSONResponse({
-                "exercise": exercise.title(),
-                "tutorials": YOUTUBE_TUTORIALS[exercise_lower],
-                "count": len(YOUTUBE_TUTORIALS[exercise_lower])
-            })
-        
-        # Partial match
-        matches = []
-        for ex_name, links in YOUTUBE_TUTORIALS.items():
-            if exercise_lower in ex_name or ex_name in exercise_lower:
-                matches.append({
-                    "exercise": ex_name.title(),
-                    "tutorials": links
-                })
-        
-        if matches:
-            return JSONResponse({"matches": matches, "count": len(matches)})
-        
-        return JSONResponse({
-            "message": f"No tutorials found for '{exercise}'. Try: squats, push ups, deadlift, etc.",
-            "available_exercises": list(YOUTUBE_TUTORIALS.keys())
-        }, status_code=404)
-        
+        return catalog_response(request, *get_tutorial_catalog().lookup(exercise))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/tutorials")
-async def list_all_exercises():
+async def list_all_exercises(request: Request):
     """List all available exercises with tutorial links"""
     try:
-        all_exercises = []
-        for exercise, links in YOUTUBE_TUTORIALS.items():
-            all_exercises.append({
-                "exercise": exercise.title(),
-                "tutorial_count": len(links),
-                "links": links
-            })
-        
-        return JSONResponse({
-            "total_exercises": len(all_exercises),
-            "exercises": all_exercises
-        })
+        return catalog_response(request, *get_tutorial_catalog().list_response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 # ==================== TTS & STT ====================
+TTS_CACHE_MEMORY_MB = float(os.getenv("TTS_CACHE_MEMORY_MB", "64"))
+TTS_CACHE_DISK_MB = float(os.getenv("TTS_CACHE_DISK_MB", "512"))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(tempfile.gettempdir(), "fitbot-tts-cache"))  # "" = memory only
+
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "4"))
+TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "64"))
+TTS_DEFAULT_FORMAT = os.getenv("TTS_DEFAULT_FORMAT", "wav")
+
+# Output formats: mp3 is gTTS's native output and needs no transcode
+TTS_MEDIA_TYPES = {"mp3": "audio/mpeg", "wav": "audio/wav", "opus": "audio/ogg"}
+TTS_ACCEPT_FORMATS = {
+    "audio/mpeg": "mp3", "audio/mp3": "mp3",
+    "audio/wav": "wav", "audio/wave": "wav", "audio/x-wav": "wav",
+    "audio/ogg": "opus", "audio/opus": "opus",
+}
+
+# gTTS and ffmpeg block, so they run here instead of on the event loop
+tts_executor = ThreadPoolExecutor(max_workers=TTS_WORKERS, thread_name_prefix="tts")
+
+# Keyed on (cleaned text, language, format) so identical coaching lines are synthesized once
+tts_cache = AudioCache(
+    memory_bytes=int(TTS_CACHE_MEMORY_MB * 1024 * 1024),
+    disk_bytes=int(TTS_CACHE_DISK_MB * 1024 * 1024),
+    directory=TTS_CACHE_DIR or None,
+    shared_directory=WEB_CONCURRENCY > 1,
+    executor=tts_executor,
+)
+
+# Identical synthesis jobs (text, language, format) in flight at once share one job
+tts_flight = SingleFlight(enabled=SINGLE_FLIGHT)
+
+# One slot per worker thread, so jobs queue here (voice replies first) rather than in the pool
+tts_admission = AdmissionQueue("tts", "Text-to-speech", TTS_WORKERS, TTS_MAX_QUEUE)
+
+def negotiate_tts_format(requested: str, accept: str) -> str:
+    """Pick the output format from the request body, then the Accept header"""
+    if requested:
+        requested = requested.lower()
+        if requested not in TTS_MEDIA_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unsupported format '{requested}'. Use one of: {', '.join(TTS_MEDIA_TYPES)}",
+            )
+        return requested
+
+    preferences = []
+    for position, item in enumerate(accept.split(",") if accept else []):
+        media_type, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    pass
+        preferences.append((-quality, position, media_type.strip().lower()))
+    for quality, _, media_type in sorted(preferences):
+        if quality < 0 and media_type in TTS_ACCEPT_FORMATS:
+            return TTS_ACCEPT_FORMATS[media_type]
+    return TTS_DEFAULT_FORMAT
+
+def synthesize_mp3(clean_text: str, language_code: str) -> bytes:
+    """gTTS straight into a memory buffer"""
+    buffer = io.BytesIO()
+    with timed(tts_synthesis_seconds):
+        gTTS = tts_service.get()
+        gTTS(text=clean_text, lang=language_code).write_to_fp(buffer)
+    return buffer.getvalue()
+
+def transcode_mp3(mp3: bytes, audio_format: str) -> bytes:
+    """Transcode MP3 bytes through ffmpeg pipes (no temp files)"""
+    if audio_format == "mp3":
+        return mp3
+    if audio_format == "opus":
+        args = ["-c:a", "libopus", "-b:a", "32k", "-f", "ogg"]
+    else:
+        # Raw PCM out; the WAV header is written here so its sizes are always correct
+        args = ["-ar", "44100", "-ac", "2", "-f", "s16le"]
+    with timed(tts_transcode_seconds, audio_format):
+        result = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-f", "mp3", "-i", "pipe:0", *args, "pipe:1"],
+            input=mp3, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+        )
+    if audio_format == "opus":
+        return result.stdout
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(2)
+        wav.setsampwidth(2)
+        wav.setframerate(44100)
+        wav.writeframes(result.stdout)
+    return buffer.getvalue()
+
+def synthesize_audio(clean_text: str, language_code: str, audio_format: str) -> bytes:
+    """Full TTS pipeline in memory; runs on tts_executor"""
+    return transcode_mp3(synthesize_mp3(clean_text, language_code), audio_format)
+
+def synthesize_to_cache(clean_text: str, language_code: str, audio_format: str, cache_key: str) -> tuple:
+    """synthesize_audio plus the tts_cache disk write, in the same tts_executor job"""
+    audio = synthesize_audio(clean_text, language_code, audio_format)
+    return audio, tts_cache.write_file(cache_key, audio)
+
+async def synthesize_cached(
+    clean_text: str, language_code: str, audio_format: str, priority: int = PRIORITY_INTERACTIVE
+) -> bytes:
+    """Audio for already-cleaned text, from tts_cache or the worker pool"""
+    cache_key = AudioCache.key(clean_text, language_code, audio_format)
+    audio = await tts_cache.aget(cache_key)
+    if audio is None:
+        async def synthesize():
+            async with tts_admission.slot(priority):
+                loop = asyncio.get_running_loop()
+                result, on_disk = await loop.run_in_executor(
+                    tts_executor, synthesize_to_cache, clean_text, language_code, audio_format, cache_key
+                )
+            tts_cache.add(cache_key, result, on_disk)
+            return result
+
+        audio = await tts_flight.run(cache_key, synthesize)
+    return audio
+
 @app.post("/tts")
-async def text_to_speech(req: TTSRequest):
-    """Convert text to speech"""
+async def text_to_speech(req: TTSRequest, request: Request):
+    """Convert text to speech (format: mp3, wav or opus; default wav)"""
     try:
+        enforce_rate_limit(client_key(request))
+        audio_format = negotiate_tts_format(req.format, request.headers.get("accept"))
         clean_text = clean_text_for_tts(req.text)
-        tmp_mp3 = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        tts = gTTS(text=clean_text, lang=req.language_code)
-        tts.save(tmp_mp3.name)
-
-        tmp_wav = tempfile.NamedTemporaryFile(delete=False, suffix=".wav")
-        subprocess.run(
-            ["ffmpeg", "-y", "-i", tmp_mp3.name, "-ar", "44100", "-ac", "2", tmp_wav.name],
-            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        audio = await synthesize_cached(clean_text, req.language_code, audio_format, PRIORITY_BULK)
+        extension = "ogg" if audio_format == "opus" else audio_format
+        return Response(
+            content=audio,
+            media_type=TTS_MEDIA_TYPES[audio_format],
+            headers={"Content-Disposition": f'attachment; filename="speech.{extension}"'},
         )
-        os.remove(tmp_mp3.name)
-        return FileResponse(tmp_wav.name, media_type="audio/wav", filename="speech.wav")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"TTS Error: {str(e)}")
 
-recognizer = sr.Recognizer()
-@app.post("/stt")
-async def speech_to_text(file: UploadFile = File(...)):
-    """Convert speech to text"""
+# ==================== STREAMING TTS ====================
+TTS_STREAM_PREFETCH = int(os.getenv("TTS_STREAM_PREFETCH", "3"))
+TTS_CHUNK_MIN_CHARS = 30
+TTS_CHUNK_MAX_CHARS = 250
+
+TTS_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# Streaming WAV header: sizes are unknown up front, so they are set to the maximum
+WAV_STREAM_HEADER = struct.pack(
+    "<4sI4s4sIHHIIHH4sI",
+    b"RIFF", 0xFFFFFFFF, b"WAVE", b"fmt ", 16, 1, 2, 44100, 44100 * 4, 4, 16, b"data", 0xFFFFFFFF,
+)
+
+def split_tts_chunks(text: str) -> list:
+    """
+    Split cleaned text into sentence-sized chunks.
+
+    The first sentence is always its own chunk so audio starts quickly;
+    fragments shorter than TTS_CHUNK_MIN_CHARS (headings, short list items)
+    are joined to the chunk before them.
+    """
+    chunks = []
+    for sentence in TTS_SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        short = len(sentence) < TTS_CHUNK_MIN_CHARS or (len(chunks) > 1 and len(chunks[-1]) < TTS_CHUNK_MIN_CHARS)
+        if len(chunks) > 1 and short and len(chunks[-1]) + len(sentence) < TTS_CHUNK_MAX_CHARS:
+            chunks[-1] = f"{chunks[-1]} {sentence}"
+        else:
+            chunks.append(sentence)
+    return chunks
+
+def wav_frames(wav_bytes: bytes) -> bytes:
+    """PCM frames of a WAV file"""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wav:
+        return wav.readframes(wav.getnframes())
+
+async def stream_tts_audio(chunks: list, language_code: str, audio_format: str, priority: int = PRIORITY_INTERACTIVE):
+    """
+    Yield audio for each chunk in order while later chunks synthesize.
+
+    At most TTS_STREAM_PREFETCH chunks are in flight per request, so one long
+    reply can't take over the whole worker pool.
+    """
+    if audio_format == "wav":
+        yield WAV_STREAM_HEADER
+
+    pending = deque()
+    remaining = iter(chunks)
+    for chunk in islice(remaining, TTS_STREAM_PREFETCH):
+        pending.append(asyncio.ensure_future(synthesize_cached(chunk, language_code, audio_format, priority)))
+    try:
+        while pending:
+            audio = await pending.popleft()
+            next_chunk = next(remaining, None)
+            if next_chunk is not None:
+                pending.append(asyncio.ensure_future(synthesize_cached(next_chunk, language_code, audio_format, priority)))
+            # MP3 frames and chained Ogg streams concatenate as-is; WAV needs bare PCM
+            yield wav_frames(audio) if audio_format == "wav" else audio
+    finally:
+        for task in pending:
+            task.cancel()
+
+@app.post("/tts/stream")
+async def text_to_speech_stream(req: TTSRequest, request: Request):
+    """Convert text to speech sentence by sentence, streaming audio as each chunk is ready"""
+    enforce_rate_limit(client_key(request))
+    tts_admission.check(PRIORITY_BULK)
+    audio_format = negotiate_tts_format(req.format, request.headers.get("accept"))
+    chunks = split_tts_chunks(clean_text_for_tts(req.text))
+    if not chunks:
+        raise HTTPException(status_code=400, detail="No speakable text")
+
+    async def audio_stream():
+        try:
+            async for data in stream_tts_audio(chunks, req.language_code, audio_format, PRIORITY_BULK):
+                yield data
+        except Exception as e:
+            # Headers are already sent; end the stream early
+            print(f"TTS stream error: {e}")
+
+    extension = "ogg" if audio_format == "opus" else audio_format
+    return StreamingResponse(
+        audio_stream(),
+        media_type=TTS_MEDIA_TYPES[audio_format],
+        headers={"Content-Disposition": f'attachment; filename="speech.{extension}"'},
+    )
+
+STT_BACKEND = os.getenv("STT_BACKEND", "google")
+STT_WORKERS = int(os.getenv("STT_WORKERS", "4"))
+STT_MAX_QUEUE = int(os.getenv("STT_MAX_QUEUE", "32"))
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "en-US")
+
+class RecognizerBackend(abc.ABC):
+    """
+    Speech recognition engine behind /stt.
+
+    recognize() runs on a worker thread and raises sr.UnknownValueError or
+    sr.RequestError the way speech_recognition's recognizers do.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def recognize(self, audio: "sr.AudioData", language: str) -> str:
+        """Transcript of audio in language"""
+
+class GoogleRecognizerBackend(RecognizerBackend):
+    """Google Web Speech API (network)"""
+
+    name = "google"
+
+    def recognize(self, audio, language):
+        return stt_service.get().Recognizer().recognize_google(audio, language=language)
+
+class SphinxRecognizerBackend(RecognizerBackend):
+    """CMU Sphinx, fully offline (requires the pocketsphinx package)"""
+
+    name = "sphinx"
+
+    def recognize(self, audio, language):
+        return stt_service.get().Recognizer().recognize_sphinx(audio, language=language)
+
+STT_BACKENDS = {
+    GoogleRecognizerBackend.name: GoogleRecognizerBackend,
+    SphinxRecognizerBackend.name: SphinxRecognizerBackend,
+}
+
+try:
+    stt_backend = STT_BACKENDS[STT_BACKEND]()
+except KeyError:
+    print(f"⚠️ WARNING: unknown STT_BACKEND '{STT_BACKEND}', using google")
+    stt_backend = GoogleRecognizerBackend()
+
+# Recognition blocks on I/O or CPU, so it runs here instead of on the event loop
+stt_executor = ThreadPoolExecutor(max_workers=STT_WORKERS, thread_name_prefix="stt")
+stt_admission = AdmissionQueue("stt", "Speech recognition", STT_WORKERS, STT_MAX_QUEUE)
+
+def transcribe_audio(data: bytes, language: str) -> str:
+    """Decode WAV/AIFF/FLAC bytes in memory and recognize them; runs on stt_executor"""
+    sr = stt_service.get()  # the first call may import speech_recognition, off the event loop
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-            tmp.write(await file.read())
-            tmp_path = tmp.name
-        
-        with sr.AudioFile(tmp_path) as source:
-            audio_data = recognizer.record(source)
-            transcript = recognizer.recognize_google(audio_data)
-        
-        os.remove(tmp_path)
-        return JSONResponse({"transcript": transcript})
+        with timed(stt_recognition_seconds, stt_backend.name):
+            with sr.AudioFile(io.BytesIO(data)) as source:
+                # A recognizer per call: nothing shared between concurrent users
+                audio_data = sr.Recognizer().record(source)
+            return stt_backend.recognize(audio_data, language)
     except sr.UnknownValueError:
         raise HTTPException(status_code=400, detail="Could not understand audio")
     except sr.RequestError as e:
         raise HTTPException(status_code=503, detail=f"Speech recognition service error: {str(e)}")
+    except ValueError as e:
+        # speech_recognition raises ValueError for unsupported or corrupt audio
+        raise HTTPException(status_code=400, detail=f"Unsupported audio: {str(e)}")
+
+async def recognize_speech(data: bytes, language: str) -> str:
+    """Transcribe uploaded audio on stt_executor; failures arrive as HTTP errors"""
+    async with stt_admission.slot():
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(stt_executor, transcribe_audio, data, language)
+
+@app.post("/stt")
+async def speech_to_text(request: Request, file: UploadFile = File(...), language: str = Form(STT_LANGUAGE)):
+    """Convert speech to text"""
+    try:
+        enforce_rate_limit(client_key(request))
+        transcript = await recognize_speech(await file.read(), language)
+        return FastJSONResponse({"transcript": transcript})
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"STT Error: {str(e)}")
 
+# ==================== VOICE CHAT ENDPOINT ====================
+@app.post("/voice-chat")
+async def voice_chat(
+    file: UploadFile = File(...),
+    user_id: str = Form(...),
+    chat_history: str = Form("[]"),
+    session: bool = Form(False),
+    return_history: bool = Form(True),
+    language: str = Form(STT_LANGUAGE),
+    format: str = Form("mp3"),
+):
+    """
+    Audio in, streamed reply audio out: STT -> chat -> TTS in one request.
+
+    Streams Server-Sent Events: `transcript`, then the /chat/stream events
+    (`token`, `tutorial`) interleaved with `audio` events (base64, one
+    playable file per sentence, in order, starting while the reply is still
+    being generated), and finally `done` or `error`.
+    """
+    if not await get_groq_client():
+        raise HTTPException(status_code=503, detail="Groq Client not initialized. Check API Key.")
+    enforce_rate_limit(user_id)
+    groq_admission.check()
+    audio_format = negotiate_tts_format(format, None)
+    try:
+        history = json.loads(chat_history)
+        if not isinstance(history, list):
+            raise ValueError("chat_history must be a JSON list")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid chat_history: {str(e)}")
+
+    try:
+        transcript = await recognize_speech(await file.read(), language)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"STT Error: {str(e)}")
+
+    chat_request = ChatRequest(
+        message=transcript, user_id=user_id, chat_history=history, session=session, return_history=return_history
+    )
+    turn = await prepare_chat_turn(chat_request)
+    tts_language = language.split("-")[0].lower()
+
+    async def event_stream():
+        yield sse_event("transcript", {"text": transcript})
+
+        events = asyncio.Queue()
+        tts_jobs = asyncio.Queue()  # synthesis tasks in reply order; None ends the queue
+        final = {}
+
+        def speak(text: str):
+            text = clean_text_for_tts(text).strip()
+            if text:
+                tts_jobs.put_nowait(asyncio.ensure_future(synthesize_cached(text, tts_language, audio_format)))
+
+        async def run_chat():
+            # Cut the token stream into sentences and start TTS on each as it completes
+            pending, chunk, spoken = "", "", 0
+            try:
+                async for event, data in chat_turn_events(chat_request, turn):
+                    if event in ("done", "error"):
+                        final[event] = data
+                        continue
+                    await events.put((event, data))
+                    if event != "token":
+                        continue
+                    pending += data["text"]
+                    *sentences, pending = TTS_SENTENCE_SPLIT.split(pending)
+                    for sentence in filter(str.strip, sentences):
+                        chunk = f"{chunk} {sentence.strip()}".strip()
+                        # First sentence goes out alone for fast first audio; then batch short ones
+                        if spoken == 0 or len(chunk) >= TTS_CHUNK_MIN_CHARS:
+                            speak(chunk)
+                            chunk, spoken = "", spoken + 1
+                speak(f"{chunk} {pending}")
+            finally:
+                tts_jobs.put_nowait(None)
+
+        async def run_audio():
+            seq = 0
+            while True:
+                job = await tts_jobs.get()
+                if job is None:
+                    break
+                try:
+                    audio = await job
+                except Exception as e:
+                    print(f"TTS Error: {e}")
+                    await events.put(("error", {"detail": f"TTS Error: {str(e)}"}))
+                    continue
+                await events.put(("audio", {
+                    "seq": seq,
+                    "format": audio_format,
+                    "media_type": TTS_MEDIA_TYPES[audio_format],
+                    "data": base64.b64encode(audio).decode("ascii"),
+                }))
+                seq += 1
+            await events.put(None)
+
+        chat_task = asyncio.create_task(run_chat())
+        audio_task = asyncio.create_task(run_audio())
+        try:
+            while (item := await events.get()) is not None:
+                yield sse_event(*item)
+            await chat_task
+            for event, data in final.items():
+                yield sse_event(event, data)
+        finally:
+            chat_task.cancel()
+            audio_task.cancel()
+            while not tts_jobs.empty():
+                job = tts_jobs.get_nowait()
+                if job is not None:
+                    job.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ==================== METRICS ENDPOINT ====================
+def metric_family(name: str, kind: str, documentation: str, samples: list) -> list:
+    """Exposition lines for a counter or gauge; samples are (labels dict, value)"""
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{prometheus_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return lines
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: stage latency histograms plus queue, cache and coalescing counters"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+
+    queues = {queue.name: queue.stats() for queue in (groq_admission, tts_admission, stt_admission)}
+    lines += metric_family("fitbot_admission_active", "gauge", "Calls holding an upstream slot",
+                           [({"queue": name}, q["active"]) for name, q in queues.items()])
+    lines += metric_family("fitbot_admission_waiting", "gauge", "Calls waiting for an upstream slot",
+                           [({"queue": name}, q["waiting"]) for name, q in queues.items()])
+    lines += metric_family("fitbot_admission_rejected_total", "counter", "Calls rejected with 429 because the queue was full",
+                           [({"queue": name}, q["rejected"]) for name, q in queues.items()])
+    lines += metric_family("fitbot_rate_limited_total", "counter", "Requests rejected by the per-user rate limit",
+                           [({}, user_rate_limiter.limited)])
+    lines += metric_family("fitbot_coalesced_total", "counter", "Calls that shared an identical in-flight call",
+                           [({"kind": "llm"}, llm_flight.coalesced), ({"kind": "tts"}, tts_flight.coalesced)])
+    lines += metric_family("fitbot_cache_hits_total", "counter", "Cache hits", [
+        ({"cache": "plan"}, plan_cache.hits),
+        ({"cache": "faq"}, faq_cache.hits),
+        ({"cache": "tts_memory"}, tts_cache.memory_hits),
+        ({"cache": "tts_disk"}, tts_cache.disk_hits),
+    ])
+    lines += metric_family("fitbot_cache_misses_total", "counter", "Cache misses", [
+        ({"cache": "plan"}, plan_cache.misses),
+        ({"cache": "faq"}, faq_cache.misses),
+        ({"cache": "tts"}, tts_cache.misses),
+    ])
+    lines += metric_family("fitbot_model_errors_total", "counter", "Failed Groq calls per model",
+                           [({"model": model}, stats["errors"] + stats["timeouts"]) for model, stats in model_stats.items()])
+    lines += metric_family("fitbot_service_load_seconds", "gauge", "Time to import or create each lazy service",
+                           [({"service": s.name}, s.load_seconds) for s in LAZY_SERVICES if s.load_seconds is not None])
+    lines += metric_family("fitbot_active_sessions", "gauge", "Server-side chat sessions", [({}, await chat_sessions.alen())])
+    return Response("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # ==================== HEALTH CHECK ====================
 @app.get("/health")
 async def health_check():
-    return JSONResponse({
+    return FastJSONResponse({
         "status": "healthy",
         "service": "FitBot AI Fitness Assistant",
-        "groq_connected": groq_client is not None,
-        "total_exercises": len(YOUTUBE_TUTORIALS),
-        "storage": "Client-side (no server storage)",
+        "groq_connected": groq_client is not None or groq_service.state == "ready",
+        "total_exercises": len(get_tutorial_catalog()),
+        "storage": "Client-side, or server-side sessions (SQLite)" if SESSION_DB_PATH else "Client-side, or server-side sessions (in-memory)",
+        "active_sessions": len(chat_sessions),  # no SQLite here: shared mode shows the last /metrics count
+        "workers": WEB_CONCURRENCY,
+        "shared_state": bool(SHARED_STATE_DB),
+        "plan_cache": plan_cache.stats(),
+        "faq_cache": faq_cache.stats(),
+        "model_routing": routing_report(),
+        "tts_cache": tts_cache.stats(),
+        "coalescing": {"llm": llm_flight.stats(), "tts": tts_flight.stats()},
+        "admission": {
+            "groq": groq_admission.stats(),
+            "tts": tts_admission.stats(),
+            "stt": stt_admission.stats(),
+            "rate_limit": user_rate_limiter.stats(),
+        },
+        "stt_backend": stt_backend.name,
         "features": [
             "Personalized Workout Plans",
             "Nutrition Guidance", 
@@ -611,4 +3483,19 @@ async def health_check():
             "Voice Input/Output Support",
             "Fitness-Only Focus"
         ]
-    })
\ No newline at end of file
+    })
+
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 503 while a lazy service is still loading or failed to load.
+    With WARMUP=0, services not used yet count as ready. /health is liveness
+    only and answers as soon as the process is up.
+    """
+    pending = [s.name for s in LAZY_SERVICES if s.state != "ready" and (WARMUP or s.state != "cold")]
+    return FastJSONResponse({
+        "ready": not pending,
+        "warmup": WARMUP,
+        "warmup_s": round(warmup_seconds, 3) if warmup_seconds is not None else None,
+        "services": {s.name: s.stats() for s in LAZY_SERVICES},
+    }, status_code=503 if pending else 200)
\ No newline at end of file
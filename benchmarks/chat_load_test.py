@@ -0,0 +1,105 @@
+"""
+Load test: /ping latency while /chat is saturated.
+
+Runs the app in-process with a fake Groq client so no API key or network
+is needed. Use --blocking to simulate the old synchronous client and see
+the event loop stall.
+
+    python benchmarks/chat_load_test.py --chat-concurrency 200 --latency 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+import httpx
+
+# Every client sends the same standalone "Hi"; keep each one a real (fake) Groq call
+os.environ.setdefault("FAQ_CACHE_SIZE", "0")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+
+class FakeCompletions:
+    def __init__(self, latency: float, blocking: bool):
+        self.latency = latency
+        self.blocking = blocking
+
+    async def create(self, messages, **kwargs):
+        if self.blocking:
+            time.sleep(self.latency)
+        else:
+            await asyncio.sleep(self.latency)
+        message = SimpleNamespace(content="Got it! How many days per week can you train?")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class FakeGroq:
+    def __init__(self, latency: float, blocking: bool):
+        self.chat = SimpleNamespace(completions=FakeCompletions(latency, blocking))
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args):
+    fitbot.groq_client = FakeGroq(args.latency, args.blocking)
+    transport = httpx.ASGITransport(app=fitbot.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=None) as client:
+
+        async def ping_loop(samples, stop):
+            while not stop.is_set():
+                start = time.perf_counter()
+                await client.get("/ping")
+                samples.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(args.ping_interval)
+
+        async def chat_once(i):
+            resp = await client.post("/chat", json={"message": "Hi", "user_id": f"load-{i}"})
+            return resp.status_code
+
+        # Baseline /ping with an idle server
+        idle, stop = [], asyncio.Event()
+        task = asyncio.create_task(ping_loop(idle, stop))
+        await asyncio.sleep(args.latency)
+        stop.set()
+        await task
+
+        # /ping while /chat is saturated
+        loaded, stop = [], asyncio.Event()
+        task = asyncio.create_task(ping_loop(loaded, stop))
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(chat_once(i) for i in range(args.chat_concurrency)))
+        chat_elapsed = time.perf_counter() - start
+        stop.set()
+        await task
+
+    print(f"mode:              {'blocking (sync client)' if args.blocking else 'async client'}")
+    print(f"/chat requests:    {len(statuses)} ({statuses.count(200)} ok) in {chat_elapsed:.2f}s")
+    for label, samples in (("idle", idle), ("loaded", loaded)):
+        print(
+            f"/ping {label:<7} n={len(samples):<4} "
+            f"p50={statistics.median(samples):.2f}ms "
+            f"p99={percentile(samples, 99):.2f}ms "
+            f"max={max(samples):.2f}ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chat-concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=2.0, help="fake Groq latency in seconds")
+    parser.add_argument("--ping-interval", type=float, default=0.05)
+    parser.add_argument("--blocking", action="store_true", help="simulate the old synchronous Groq call")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
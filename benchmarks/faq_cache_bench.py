@@ -0,0 +1,109 @@
+"""
+Benchmark: FAQ cache lookup latency and match quality.
+
+Fills FAQCache with --size questions (a seed set of real standalone
+questions plus synthetic fillers) and reports per-lookup latency. Then, for
+each threshold, the share of paraphrases answered from cache (hits) and the
+share of different-but-similar questions wrongly answered (false hits).
+
+    python benchmarks/faq_cache_bench.py
+    python benchmarks/faq_cache_bench.py --size 5000 --thresholds 0.7,0.75,0.8,0.85
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+SEED = [
+    "how much water should I drink",
+    "is creatine safe",
+    "how much protein should I eat",
+    "what's the weather today",
+    "can you write me a poem",
+    "how many calories should I eat to lose weight",
+    "what is the best time to work out",
+    "should I stretch before running",
+    "how do I do a proper push up",
+    "how long should I rest between sets",
+    "is it ok to work out every day",
+    "what should I eat before a workout",
+    "should I do weights before cardio",
+]
+
+# (asked, cached question it should match)
+PARAPHRASES = [
+    ("How much water should I drink per day?", "how much water should I drink"),
+    ("how much water should i drink daily", "how much water should I drink"),
+    ("Is creatine safe?", "is creatine safe"),
+    ("is creatine safe to take", "is creatine safe"),
+    ("how much protein should i eat a day", "how much protein should I eat"),
+    ("whats the weather today?", "what's the weather today"),
+    ("how many calories should i eat to lose weight?", "how many calories should I eat to lose weight"),
+    ("what's the best time to work out", "what is the best time to work out"),
+    ("should i stretch before i run", "should I stretch before running"),
+    ("how to do a proper pushup", "how do I do a proper push up"),
+    ("how long should I rest between my sets", "how long should I rest between sets"),
+    ("is it okay to work out every day", "is it ok to work out every day"),
+    ("Should I do weights before cardio?", "should I do weights before cardio"),
+]
+
+# Close in wording, different answer
+NEAR_MISSES = [
+    "how much water should I drink after a workout",
+    "is creatine bad for kidneys",
+    "how much protein should I eat to build muscle",
+    "what should I eat after a workout",
+    "how long should I rest between workouts",
+    "should I stretch after running",
+    "how do I do a proper pull up",
+    "how many calories should I eat to gain weight",
+    "is it ok to run every day",
+    "what's the weather tomorrow",
+    "is creatine not safe",
+    "should I do cardio before weights",
+]
+
+
+def filled_cache(size: int, threshold: float):
+    cache = fitbot.FAQCache(size, threshold, ttl_seconds=3600)
+    for question in SEED:
+        cache.add(question, f"answer: {question}")
+    i = 0
+    while len(cache) < size:
+        cache.add(f"filler question {i} about exercise variation {i * 7 % 101} and recovery", f"filler {i}")
+        i += 1
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=1000, help="cached questions")
+    parser.add_argument("--thresholds", default="0.7,0.75,0.8,0.85,0.9")
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+    fitbot.faq_service.get()
+
+    cache = filled_cache(args.size, fitbot.FAQ_CACHE_THRESHOLD)
+    questions = [asked for asked, _ in PARAPHRASES] + NEAR_MISSES
+    timings = []
+    for i in range(args.lookups):
+        start = time.perf_counter()
+        cache.lookup(questions[i % len(questions)])
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print(f"{args.size} cached questions, {args.lookups} lookups: "
+          f"p50 {timings[len(timings) // 2] * 1000:.3f} ms, p99 {timings[int(len(timings) * 0.99)] * 1000:.3f} ms\n")
+
+    print(f"{'threshold':>10}{'hits':>10}{'false hits':>12}")
+    for threshold in map(float, args.thresholds.split(",")):
+        cache.threshold = threshold
+        hits = sum(cache.lookup(asked) == f"answer: {expected}" for asked, expected in PARAPHRASES)
+        false_hits = sum(cache.lookup(question) is not None for question in NEAR_MISSES)
+        print(f"{threshold:>10}{hits / len(PARAPHRASES):>10.0%}{false_hits / len(NEAR_MISSES):>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
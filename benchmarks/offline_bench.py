@@ -0,0 +1,389 @@
+"""
+Offline benchmark suite: every endpoint, local stand-ins for every upstream.
+
+Runs the app in-process with fakes for Groq (time to first token + token
+rate, streaming and non-streaming), gTTS, ffmpeg and the speech recognizer,
+so no API key or network is needed. Each endpoint is driven at a fixed
+concurrency; the report has p50/p95/p99 latency, throughput, status counts
+and process memory, and is written to a JSON file that a later run can be
+compared against.
+
+    python benchmarks/offline_bench.py --concurrency 50 --requests 500 --output before.json
+    python benchmarks/offline_bench.py --concurrency 50 --requests 500 --compare before.json
+
+Latency is measured to the last byte: the in-process transport buffers
+streamed responses, so time to first byte is not visible here.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import wave
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import httpx
+
+# The suite measures the service, not the per-user limiter, the on-disk caches or the FAQ cache
+os.environ.setdefault("USER_RATE_PER_MINUTE", "0")
+os.environ.setdefault("TTS_CACHE_DIR", "")
+os.environ.setdefault("FAQ_CACHE_SIZE", "0")  # "Hi, I'm client N" would all match one cached answer
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+REPLY_WORDS = (
+    "Awesome! Here's your 3-day plan. **Day 1 - Full Body:** - Push-ups: 3 sets of 10 reps "
+    "- Squats: 3 sets of 15 reps - Plank: 3 sets of 30 seconds. **Day 2 - Cardio:** - Burpees: "
+    "3 sets of 10 - Jumping jacks: 3 sets of 30 - Mountain climbers: 3 sets of 20. **Day 3 - Legs "
+    "& Core:** - Lunges: 3 sets of 12 reps each leg - Glute bridges: 3 sets of 15 - Russian twists: "
+    "3 sets of 20. Drink plenty of water and rest well between sessions. Ready to crush it?"
+).split()
+
+ENDPOINTS = (
+    "ping", "health", "metrics", "tutorials", "tutorial",
+    "chat", "chat_stream", "chat_batch", "tts", "tts_stream", "stt", "voice_chat",
+)
+
+
+# ==================== FAKE UPSTREAMS ====================
+def fake_reply(tokens: int) -> list:
+    """Reply split into `tokens` deltas (one word each, repeating the sample plan)"""
+    return [REPLY_WORDS[i % len(REPLY_WORDS)] + " " for i in range(tokens)]
+
+
+class FakeStream:
+    def __init__(self, deltas, delay, usage):
+        self.deltas = deltas
+        self.delay = delay
+        self.usage = usage
+        self.index = 0
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.index > len(self.deltas):
+            raise StopAsyncIteration
+        if self.index == len(self.deltas):
+            # Groq sends usage on a final chunk with no choices
+            self.index += 1
+            return SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=self.usage))
+        if self.index:
+            await asyncio.sleep(self.delay)
+        delta = SimpleNamespace(content=self.deltas[self.index])
+        self.index += 1
+        return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], x_groq=None)
+
+
+class FakeCompletions:
+    """Time to first token, then `token_rate` tokens/s; usage is reported like Groq's"""
+
+    def __init__(self, ttft: float, token_rate: float, reply_tokens: int):
+        self.ttft = ttft
+        self.token_rate = token_rate
+        self.reply_tokens = reply_tokens
+        self.calls = 0
+
+    async def create(self, messages, model=None, stream=False, max_tokens=None, **kwargs):
+        self.calls += 1
+        tokens = min(self.reply_tokens, max_tokens or self.reply_tokens)
+        usage = SimpleNamespace(
+            prompt_tokens=sum(len(m["content"]) for m in messages) // 4,
+            completion_tokens=tokens,
+        )
+        deltas = fake_reply(tokens)
+        await asyncio.sleep(self.ttft)
+        if stream:
+            return FakeStream(deltas, 1 / self.token_rate, usage)
+        await asyncio.sleep(tokens / self.token_rate)
+        message = SimpleNamespace(content="".join(deltas))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+class FakeGroq:
+    def __init__(self, ttft: float, token_rate: float, reply_tokens: int):
+        self.chat = SimpleNamespace(completions=FakeCompletions(ttft, token_rate, reply_tokens))
+
+
+def fake_gtts_factory(latency: float, per_char: float):
+    """gTTS stand-in: blocks its worker thread like the real network call"""
+
+    class FakeGTTS:
+        def __init__(self, text, lang="en"):
+            self.text = text
+
+        def write_to_fp(self, fp):
+            time.sleep(latency + per_char * len(self.text))
+            fp.write(b"ID3" + os.urandom(16 * len(self.text)))
+
+    return FakeGTTS
+
+
+def fake_transcode_factory(latency: float):
+    """ffmpeg stand-in: a valid file of the right kind, sized like the real output"""
+
+    def transcode(mp3: bytes, audio_format: str) -> bytes:
+        if audio_format == "mp3":
+            return mp3
+        time.sleep(latency)
+        if audio_format == "opus":
+            return b"OggS" + bytes(len(mp3))
+        buffer = io.BytesIO()
+        with wave.open(buffer, "wb") as wav:
+            wav.setnchannels(2)
+            wav.setsampwidth(2)
+            wav.setframerate(44100)
+            wav.writeframes(bytes(len(mp3) * 8))
+        return buffer.getvalue()
+
+    return transcode
+
+
+class FakeRecognizerBackend(fitbot.RecognizerBackend):
+    """Recognizer stand-in: blocks for `latency`, returns a fixed transcript"""
+
+    name = "fake"
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def recognize(self, audio, language):
+        time.sleep(self.latency)
+        return "I want to build muscle at home, three days a week"
+
+
+def silent_wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(bytes(int(seconds * rate) * 2))
+    return buffer.getvalue()
+
+
+def install_fakes(args):
+    fitbot.groq_client = FakeGroq(args.groq_ttft, args.token_rate, args.reply_tokens)
+    fitbot.tts_service = fitbot.LazyService("tts", lambda: fake_gtts_factory(args.tts_latency, args.tts_per_char))
+    fitbot.transcode_mp3 = fake_transcode_factory(args.ffmpeg_latency)
+    fitbot.stt_backend = FakeRecognizerBackend(args.stt_latency)
+
+
+# ==================== REQUESTS ====================
+def build_request(endpoint: str, i: int, args, wav: bytes) -> dict:
+    """httpx request kwargs for the i-th call; inputs are unique unless --repeat-inputs"""
+    n = 0 if args.repeat_inputs else i
+    user = f"bench-{i}"
+    if endpoint == "ping":
+        return {"method": "GET", "url": "/ping"}
+    if endpoint == "health":
+        return {"method": "GET", "url": "/health"}
+    if endpoint == "metrics":
+        return {"method": "GET", "url": "/metrics"}
+    if endpoint == "tutorials":
+        return {"method": "GET", "url": "/tutorials"}
+    if endpoint == "tutorial":
+        names = ("squats", "push ups", "plank", "lunge", "burpee")
+        return {"method": "GET", "url": f"/tutorials/{names[i % len(names)]}"}
+    if endpoint in ("chat", "chat_stream"):
+        return {
+            "method": "POST",
+            "url": "/chat" if endpoint == "chat" else "/chat/stream",
+            "json": {"message": f"Hi, I'm client {n}", "user_id": user},
+        }
+    if endpoint == "chat_batch":
+        items = [
+            {"message": f"Morning check-in {0 if args.repeat_inputs else k}", "user_id": f"{user}-{k}"}
+            for k in range(i * args.batch_size, (i + 1) * args.batch_size)
+        ]
+        return {"method": "POST", "url": "/chat/batch", "json": {"items": items}}
+    if endpoint in ("tts", "tts_stream"):
+        text = f"Great job on set {n}! Keep your core tight. Now rest for thirty seconds before the next set."
+        return {
+            "method": "POST",
+            "url": "/tts" if endpoint == "tts" else "/tts/stream",
+            "json": {"text": text, "format": args.tts_format},
+        }
+    if endpoint == "stt":
+        return {"method": "POST", "url": "/stt", "files": {"file": ("speech.wav", wav, "audio/wav")}}
+    if endpoint == "voice_chat":
+        return {
+            "method": "POST",
+            "url": "/voice-chat",
+            "files": {"file": ("speech.wav", wav, "audio/wav")},
+            "data": {"user_id": user, "format": args.tts_format},
+        }
+    raise ValueError(endpoint)
+
+
+def rss_mb() -> float:
+    """Current resident set size"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except OSError:
+        return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def drive(client, endpoint: str, args, wav: bytes) -> dict:
+    """Send --requests calls with --concurrency in flight; collect latency and status"""
+    latencies, statuses, response_bytes = [], {}, 0
+    counter = iter(range(args.requests))
+    rss_before = rss_mb()
+
+    async def worker():
+        nonlocal response_bytes
+        for i in counter:
+            request = build_request(endpoint, i, args, wav)
+            start = time.perf_counter()
+            try:
+                response = await client.request(**request)
+                status = str(response.status_code)
+                response_bytes += len(response.content)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - start
+
+    ordered = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2) if seconds is not None else None  # noqa: E731
+    return {
+        "requests": len(latencies),
+        "ok": sum(count for status, count in statuses.items() if status.startswith("2")),
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "max_ms": ms(ordered[-1] if ordered else None),
+        "mean_ms": ms(sum(ordered) / len(ordered) if ordered else None),
+        "response_bytes": response_bytes,
+        "rss_mb_before": round(rss_before, 1),
+        "rss_mb_after": round(rss_mb(), 1),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+# ==================== REPORTING ====================
+def print_table(results: dict):
+    print(f"{'endpoint':<12} {'reqs':>6} {'ok':>6} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}")
+    for endpoint, r in results.items():
+        print(
+            f"{endpoint:<12} {r['requests']:>6} {r['ok']:>6} {r['throughput_rps']:>9} "
+            f"{r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9} {r['rss_mb_after']:>8}"
+        )
+
+
+def print_comparison(baseline: dict, results: dict):
+    """Relative change per endpoint: positive latency / negative throughput is a regression"""
+    print(f"\nvs {baseline['meta'].get('revision') or 'baseline'} ({baseline['meta'].get('timestamp', '?')}):")
+    print(f"{'endpoint':<12} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for endpoint, r in results.items():
+        old = baseline["endpoints"].get(endpoint)
+        if not old:
+            continue
+
+        def change(key):
+            if not old.get(key) or r.get(key) is None:
+                return "n/a"
+            return f"{(r[key] - old[key]) / old[key] * 100:+.1f}%"
+
+        print(
+            f"{endpoint:<12} {change('throughput_rps'):>9} {change('p50_ms'):>9} "
+            f"{change('p95_ms'):>9} {change('p99_ms'):>9}"
+        )
+
+
+async def run(args):
+    install_fakes(args)
+    random.seed(0)
+    wav = silent_wav()
+    endpoints = args.endpoints.split(",") if args.endpoints else list(ENDPOINTS)
+    results = {}
+
+    transport = httpx.ASGITransport(app=fitbot.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for endpoint in endpoints:
+            results[endpoint] = await drive(client, endpoint, args, wav)
+            print(f"  {endpoint:<12} done in {results[endpoint]['elapsed_s']}s", file=sys.stderr)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": vars(args),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "groq_calls": fitbot.groq_client.chat.completions.calls,
+        },
+        "endpoints": results,
+    }
+    print_table(results)
+    print(f"\npeak RSS {report['meta']['peak_rss_mb']} MB, fake Groq calls {report['meta']['groq_calls']}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoints", default="", help=f"comma-separated subset of: {','.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=50, help="requests in flight per endpoint")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--repeat-inputs", action="store_true", help="identical inputs (exercises caches and coalescing)")
+    parser.add_argument("--batch-size", type=int, default=20, help="items per /chat/batch request")
+    parser.add_argument("--groq-ttft", type=float, default=0.3, help="fake Groq time to first token, seconds")
+    parser.add_argument("--token-rate", type=float, default=300, help="fake Groq output tokens per second")
+    parser.add_argument("--reply-tokens", type=int, default=150, help="tokens per fake reply")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="fake gTTS base latency, seconds")
+    parser.add_argument("--tts-per-char", type=float, default=0.001, help="fake gTTS seconds per character")
+    parser.add_argument("--ffmpeg-latency", type=float, default=0.05, help="fake transcode time, seconds")
+    parser.add_argument("--stt-latency", type=float, default=0.3, help="fake recognizer latency, seconds")
+    parser.add_argument("--tts-format", default="mp3", choices=("mp3", "wav", "opus"))
+    parser.add_argument("--output", default="", help="write results JSON here")
+    parser.add_argument("--compare", default="", help="results JSON from an earlier run to diff against")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark: response payload size and serialization time, before and after.
+
+For representative bodies (a /chat reply at growing history lengths, the
+/tutorials list at catalog sizes, /health stats), prints the serialized size,
+the gzip and brotli sizes the compression middleware would send (bodies under
+COMPRESSION_MIN_BYTES go out uncompressed), and the time to encode with the
+stdlib encoder JSONResponse used before against encode_json (orjson when
+installed). "new" rows are the /chat body with `return_history: false`.
+
+    python benchmarks/payload_bench.py
+    python benchmarks/payload_bench.py --history 10,50,200 --catalog 25,10000
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+from tutorial_catalog_bench import synthetic_exercises  # noqa: E402
+
+REPLY = (
+    "Awesome! Here's your 3-day plan 💪\n\n**Day 1 - Full Body:**\n- Push-ups: 3 sets of 10 reps\n"
+    "- Squats: 3 sets of 15 reps\n- Plank: 3 sets of 30 seconds\n\nDrink plenty of water. Ready to crush it? 🔥"
+)
+
+
+def stdlib_json(data) -> bytes:
+    """What starlette's JSONResponse.render does"""
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def chat_body(turns: int, return_history: bool) -> dict:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"I can train {i % 7 + 1} days a week, what should I do?"})
+        history.append({"role": "assistant", "content": REPLY})
+    tutorials = fitbot.find_relevant_tutorials(REPLY)
+    new_turn = [{"role": "user", "content": "Thanks!"}, {"role": "assistant", "content": REPLY}]
+    if return_history:
+        return {"reply": REPLY, "tutorials": tutorials, "chat_history": history + new_turn,
+                "message_count": len(history) + 2}
+    return {"reply": REPLY, "tutorials": tutorials, "new_messages": new_turn, "message_count": len(history) + 2}
+
+
+def catalog_body(size: int) -> dict:
+    catalog = fitbot.TutorialCatalog(synthetic_exercises(size))
+    return json.loads(catalog.list_response[1])
+
+
+def per_call_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def row(name: str, data) -> tuple:
+    body = stdlib_json(data)
+    number = max(1, 200_000 // len(body))
+    return (
+        name,
+        len(body),
+        len(gzip.compress(body, fitbot.GZIP_LEVEL, mtime=0)),
+        len(fitbot.brotli.compress(body, quality=fitbot.BROTLI_QUALITY)) if fitbot.brotli else None,
+        per_call_us(lambda: stdlib_json(data), number),
+        per_call_us(lambda: fitbot.encode_json(data), number),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", default="0,10,50,200", help="comma-separated /chat history lengths (turns)")
+    parser.add_argument("--catalog", default="25,1000,10000", help="comma-separated /tutorials catalog sizes")
+    args = parser.parse_args()
+
+    rows = []
+    for turns in map(int, args.history.split(",")):
+        rows.append(row(f"chat h={turns}", chat_body(turns, True)))
+        rows.append(row(f"chat h={turns} new", chat_body(turns, False)))
+    for size in map(int, args.catalog.split(",")):
+        rows.append(row(f"tutorials n={size}", catalog_body(size)))
+    health = {"admission": {"groq": fitbot.groq_admission.stats()}, "tts_cache": fitbot.tts_cache.stats(),
+              "plan_cache": fitbot.plan_cache.stats(), "model_routing": fitbot.routing_report()}
+    rows.append(row("health stats", health))
+
+    encoder = "orjson" if fitbot.orjson else "stdlib (orjson not installed)"
+    print(f"encode_json: {encoder}; brotli: {'yes' if fitbot.brotli else 'not installed'}\n")
+    print(f"{'payload':<22}{'json B':>10}{'gzip B':>10}{'br B':>10}{'stdlib us':>12}{'encode us':>12}{'speedup':>9}")
+    for name, raw, gz, br, before, after in rows:
+        print(f"{name:<22}{raw:>10}{gz:>10}{br if br is not None else '-':>10}"
+              f"{before:>12.1f}{after:>12.1f}{before / after:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
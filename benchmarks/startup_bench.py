@@ -0,0 +1,166 @@
+"""
+Cold start benchmark: time to import, to accept connections, to be ready,
+and the latency of the first requests.
+
+Each run starts a fresh `uvicorn app:app` process, the way a spun-down
+Render instance does, with GROQ_BASE_URL pointed at a local stand-in so the
+real Groq client is created and used without network access. Runs with the
+background warm-up on and off (WARMUP=1 / WARMUP=0).
+
+    python benchmarks/startup_bench.py --runs 5
+    python benchmarks/startup_bench.py --runs 5 --output startup.json
+
+Reported per mode (median over runs, seconds from process start unless ms):
+  import_s      `import app` alone, in a separate interpreter
+  listening_s   first successful GET /ping
+  first_chat_ms POST /chat sent the moment the port answers
+  second_chat_ms the next POST /chat
+  ready_s       first 200 from GET /ready
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    """Answers /openai/v1/chat/completions with a fixed, non-streamed reply"""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        body = json.dumps({
+            "id": "chatcmpl-bench",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "bench",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "Great! How many days a week can you train?"},
+                "finish_reason": "stop",
+                "logprobs": None,
+            }],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+            "system_fingerprint": None,
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_fake_groq() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGroqHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def service_env(groq_url: str, warmup: bool) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "GROQ_API_KEY": "bench",
+        "GROQ_BASE_URL": groq_url,
+        "WARMUP": "1" if warmup else "0",
+        "USER_RATE_PER_MINUTE": "0",
+        "TTS_CACHE_DIR": "",
+        "WEB_CONCURRENCY": "1",
+    })
+    return env
+
+
+def measure_import(env: dict) -> float:
+    code = "import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def wait_for(client, url: str, start: float, timeout: float) -> float:
+    """Seconds from `start` until GET url returns 200"""
+    while time.perf_counter() - start < timeout:
+        try:
+            if client.get(url).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.TransportError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def chat_ms(client, base: str, message: str) -> float:
+    start = time.perf_counter()
+    response = client.post(f"{base}/chat", json={"message": message, "user_id": "startup-bench"})
+    response.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_once(env: dict, timeout: float) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            listening = wait_for(client, f"{base}/ping", start, timeout)
+            first = chat_ms(client, base, "Hi, I want to get stronger")
+            second = chat_ms(client, base, "Hi, I want to lose weight")
+            ready = wait_for(client, f"{base}/ready", start, timeout)
+    finally:
+        process.terminate()
+        process.wait()
+    return {"listening_s": listening, "first_chat_ms": first, "second_chat_ms": second, "ready_s": ready}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="cold starts per mode")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for the service")
+    parser.add_argument("--output", default="", help="write results JSON here")
+    args = parser.parse_args()
+
+    groq_url = start_fake_groq()
+    results = {}
+    for mode, warmup in (("warmup", True), ("lazy", False)):
+        env = service_env(groq_url, warmup)
+        runs = []
+        for _ in range(args.runs):
+            sample = run_once(env, args.timeout)
+            sample["import_s"] = measure_import(env)
+            runs.append(sample)
+        results[mode] = {key: round(statistics.median(run[key] for run in runs), 3) for key in runs[0]}
+        print(f"  {mode} done", file=sys.stderr)
+
+    columns = ("import_s", "listening_s", "first_chat_ms", "second_chat_ms", "ready_s")
+    print(f"{'mode':<8}" + "".join(f"{column:>16}" for column in columns))
+    for mode, medians in results.items():
+        print(f"{mode:<8}" + "".join(f"{medians[column]:>16}" for column in columns))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": args.runs, "python": sys.version.split()[0], "results": results}, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
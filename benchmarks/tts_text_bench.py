@@ -0,0 +1,109 @@
+"""
+Micro-benchmark: clean_text_for_tts vs the original chained regexes.
+
+Times both on real plan and chat replies (Markdown headings, bullet lists,
+links, emojis and workout shorthand), including a plan with the typographic
+characters models often emit (’ – •) and a chat reply whose numbers are not
+workout shorthand ("in my 40s", "555-1234"), and prints what each one hands
+to gTTS.
+
+    python benchmarks/tts_text_bench.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+REPLIES = {
+    "greeting": "Hey there! 👋 I'm FitBot, your personal fitness trainer! 💪 What's your name?",
+    "question": "Nice to meet you, Alex! 😊 What's your main fitness goal - weight loss, "
+                "muscle gain, or general fitness? 🎯",
+    "plan": """### Your 3-Day Beginner Plan 🏋️
+
+Awesome! Here's your plan:
+
+**Day 1 - Full Body:**
+- Push-ups: 3 sets of 8-10 reps
+- Squats: 3x15
+- Plank: 3 sets of 30s
+
+**Day 2 - Cardio:**
+* Brisk walk: 20 min
+* Jumping jacks: 3 x 20
+* Mountain climbers: 3 sets of 45 sec
+
+**Day 3 - Legs & Core:**
+1. Lunges: 3 sets of 12 reps each leg
+2. Glute bridges: 3 sets of 15 reps
+3. Russian twists: 3 sets of 20 reps
+
+🥗 *Nutrition:* aim for a 300-500 calorie deficit and drink 2-3 liters of water.
+Watch [this squat guide](https://youtu.be/aclHkVaku9U) for `form` tips. Ready to crush it? 🔥""",
+}
+REPLIES["plan, typographic"] = (
+    REPLIES["plan"].replace("8-10", "8\u201310").replace("Here's", "Here\u2019s").replace("* Brisk", "\u2022 Brisk")
+)
+# Numbers that only look like workout shorthand; they must reach gTTS unchanged
+REPLIES["chat, not workout"] = (
+    "Being in my 40s is no excuse! 😄 I grew up on 1990s aerobics videos, so picture a 4x4 grid "
+    "of mats on the floor. Call the gym at 555-1234 and ask about the 2024 schedule."
+)
+
+LEGACY_EMOJI_CHARS = (
+    "\U0001F600-\U0001F64F\U0001F300-\U0001F5FF\U0001F680-\U0001F6FF\U0001F1E0-\U0001F1FF"
+    "\U00002700-\U000027BF\U0001F900-\U0001F9FF\U00002600-\U000026FF\U00002B00-\U00002BFF"
+    "\U0001FA70-\U0001FAFF"
+)
+
+
+def legacy_remove_emojis(text):
+    """The original implementation: compiles the emoji class on every call"""
+    emoji_pattern = re.compile("[" + LEGACY_EMOJI_CHARS + "]+", flags=re.UNICODE)
+    return emoji_pattern.sub(r'', text)
+
+
+def legacy_clean(text):
+    """The original implementation: six chained substitutions"""
+    text = legacy_remove_emojis(text)
+    text = re.sub(r'\*\*([^*]+)\*\*', r'\1', text)
+    text = re.sub(r'\*([^*]+)\*', r'\1', text)
+    text = re.sub(r'[\*_]+', '', text)
+    text = re.sub(r'#+', '', text)
+    text = re.sub(r'\[([^\]]+)\]\([^\)]+\)', r'\1', text)
+    text = re.sub(r'`+', '', text)
+    return text.strip()
+
+
+def bench(label, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<10} {seconds * 1e6:10.1f} us/call")
+    return seconds
+
+
+def main():
+    print("Spoken text for the sample plan reply:")
+    print("--- legacy ---")
+    print(legacy_clean(REPLIES["plan"]))
+    print("--- current ---")
+    print(fitbot.clean_text_for_tts(REPLIES["plan"]))
+    print("--- current, chat that is not a workout ---")
+    print(fitbot.clean_text_for_tts(REPLIES["chat, not workout"]))
+
+    for name, reply in REPLIES.items():
+        print(f"\n{name} reply, {len(reply)} chars:")
+        old = bench("legacy", lambda: legacy_clean(reply), 2000)
+        new = bench("current", lambda: fitbot.clean_text_for_tts(reply), 2000)
+        print(f"  speedup    {old / new:10.2f}x")
+
+    long_reply = REPLIES["plan"] * 4  # roughly a 1,500-token reply
+    print(f"\nlong reply, {len(long_reply)} chars:")
+    old = bench("legacy", lambda: legacy_clean(long_reply), 500)
+    new = bench("current", lambda: fitbot.clean_text_for_tts(long_reply), 500)
+    print(f"  speedup    {old / new:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: catalog endpoints before and after precomputed responses.
+
+Builds a synthetic tutorials.json of --size exercises and times, per request,
+the old per-call work (rebuild + serialize the list, linear partial-match
+scan) against TutorialCatalog's precomputed bodies and indexes, plus the
+end-to-end GET /tutorials with and without a matching ETag.
+
+    python benchmarks/tutorial_catalog_bench.py --size 10000
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+
+def legacy_list(tutorials):
+    """The original list_all_exercises body"""
+    all_exercises = []
+    for exercise, links in tutorials.items():
+        all_exercises.append({"exercise": exercise.title(), "tutorial_count": len(links), "links": links})
+    return fitbot.encode_json({"total_exercises": len(all_exercises), "exercises": all_exercises})
+
+
+def legacy_lookup(tutorials, exercise):
+    """The original get_exercise_tutorials matching"""
+    exercise_lower = exercise.lower().strip()
+    if exercise_lower in tutorials:
+        return tutorials[exercise_lower]
+    return [name for name in tutorials if exercise_lower in name or name in exercise_lower]
+
+
+def synthetic_exercises(size):
+    exercises = [
+        {"name": name, "links": links} for name, links in fitbot.get_tutorial_catalog().tutorials.items()
+    ]
+    i = 0
+    while len(exercises) < size:
+        exercises.append({
+            "name": f"variation {i} kettlebell complex",
+            "links": [f"https://www.youtube.com/watch?v=vid{i:07d}a", f"https://www.youtube.com/watch?v=vid{i:07d}b"],
+        })
+        i += 1
+    return exercises
+
+
+def per_call_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+async def http_bench(requests):
+    transport = httpx.ASGITransport(app=fitbot.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        first = await client.get("/tutorials")
+        etag = first.headers["etag"]
+        results = {}
+        for label, headers in (("full body", {}), ("If-None-Match", {"If-None-Match": etag})):
+            start = time.perf_counter()
+            for _ in range(requests):
+                resp = await client.get("/tutorials", headers=headers)
+            results[label] = ((time.perf_counter() - start) / requests * 1e3, resp.status_code, len(resp.content))
+        return len(first.content), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump({"exercises": synthetic_exercises(args.size)}, f)
+        path = f.name
+    try:
+        start = time.perf_counter()
+        catalog = fitbot.load_tutorial_catalog(path)
+        print(f"Catalog of {len(catalog)} exercises loaded and indexed in {(time.perf_counter() - start) * 1e3:.0f} ms")
+    finally:
+        os.remove(path)
+
+    fitbot.tutorial_catalog = catalog
+    fitbot.catalog_checked_at = float("inf")  # keep the synthetic catalog in place
+    tutorials = catalog.tutorials
+
+    print("\nPer request (us):                 legacy     indexed")
+    rows = (
+        ("GET /tutorials", lambda: legacy_list(tutorials), lambda: catalog.list_response, 20),
+        ("GET /tutorials/squats", lambda: legacy_lookup(tutorials, "squats"), lambda: catalog.lookup("squats"), 2000),
+        ("GET /tutorials/press", lambda: legacy_lookup(tutorials, "press"), lambda: catalog.lookup("press"), 200),
+    )
+    for label, old, new, number in rows:
+        if label != "GET /tutorials":
+            status = new()[0]
+            if status != 200:
+                # A miss costs something else entirely; don't report it as the lookup time
+                raise SystemExit(f"{label} returned {status}, expected 200")
+        print(f"  {label:<28} {per_call_us(old, number):10.1f}  {per_call_us(new, number):10.3f}")
+
+    body_size, results = asyncio.run(http_bench(args.requests))
+    print(f"\nEnd-to-end GET /tutorials ({body_size / 1024:.0f} KiB body):")
+    for label, (ms, status, size) in results.items():
+        print(f"  {label:<16} {ms:8.3f} ms/request  status={status}  bytes={size}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark: ExerciseMatcher vs the old substring scan in find_relevant_tutorials.
+
+Times both on a real 5-day plan reply against the shipped catalog and against
+synthetic catalogs of growing size, and prints what each one matches.
+
+    python benchmarks/tutorial_matcher_bench.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+PLAN_REPLY = """Awesome! I love working with beginners. Here's your 5-day workout plan:
+
+**Day 1 - Chest & Triceps:**
+- Push-ups: 3 sets of 12 reps
+- Tricep dips: 3 sets of 10 reps
+- Plank: 3 sets of 30 seconds
+
+**Day 2 - Back & Biceps:**
+- Pull-ups: 3 sets of 8 reps (or rows if no bar)
+- Bicep curls: 3 sets of 12 reps
+- Superman holds: 3 sets of 30 seconds
+
+**Day 3 - Legs:**
+- Squats: 4 sets of 15 reps
+- Lunges: 3 sets of 12 reps each leg
+- Calf raises: 3 sets of 20 reps
+
+**Day 4 - Shoulders & Core:**
+- Shoulder press: 3 sets of 12 reps
+- Lateral raises: 3 sets of 12 reps
+- Russian twists: 3 sets of 20 reps
+
+**Day 5 - Cardio & Full Body:**
+- HIIT workout: 20 minutes
+- Burpees: 3 sets of 10 reps
+- Medicine ball throws: 3 sets of 10
+
+For nutrition: aim for a 300-calorie deficit and drink plenty of water!
+Check the YouTube links below for form tips. Ready to crush it?"""
+
+
+def legacy_find(catalog, text):
+    """The original implementation: substring test per catalog entry"""
+    text_lower = text.lower()
+    return [exercise for exercise in catalog if exercise in text_lower]
+
+
+def synthetic_catalog(size):
+    catalog = dict(fitbot.get_tutorial_catalog().tutorials)
+    i = 0
+    while len(catalog) < size:
+        catalog[f"variation {i} kettlebell complex"] = []
+        i += 1
+    return catalog
+
+
+def bench(label, fn, number):
+    seconds = min(timeit.repeat(fn, number=number, repeat=5)) / number
+    print(f"  {label:<10} {seconds * 1e6:10.1f} us/call")
+    return seconds
+
+
+def main():
+    reply = PLAN_REPLY * 2  # roughly a 1,500-token reply
+    shipped = fitbot.get_tutorial_catalog()
+    print("Matches on a sample plan reply:")
+    print("  legacy: ", legacy_find(shipped.tutorials, PLAN_REPLY))
+    print("  matcher:", shipped.matcher.find(PLAN_REPLY))
+
+    for size in (len(shipped), 1000, 5000):
+        catalog = synthetic_catalog(size)
+        matcher = fitbot.ExerciseMatcher(catalog, shipped.aliases)
+        print(f"\nCatalog of {len(catalog)} exercises, {len(reply)} chars of text:")
+        old = bench("legacy", lambda: legacy_find(catalog, reply), 200)
+        new = bench("matcher", lambda: matcher.find(reply), 200)
+        print(f"  speedup    {old / new:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
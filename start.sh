@@ -5,5 +5,23 @@
 # Use PORT environment variable from Render, default to 8000 for local
 PORT=${PORT:-8000}
 
+# CPUs this container may actually use: the cgroup quota if there is one, else the core count
+available_cpus() {
+    local cores quota period
+    cores=$(nproc 2>/dev/null || echo 1)
+    if [ -r /sys/fs/cgroup/cpu.max ]; then
+        read -r quota period < /sys/fs/cgroup/cpu.max
+        if [ "$quota" != "max" ] && [ -n "$period" ]; then
+            quota=$(( (quota + period - 1) / period ))
+            [ "$quota" -lt "$cores" ] && cores=$quota
+        fi
+    fi
+    echo $(( cores > 0 ? cores : 1 ))
+}
+
+# One worker per CPU unless WEB_CONCURRENCY is set. With more than one, the app keeps
+# sessions and caches in a shared SQLite file (SHARED_STATE_DB) instead of per process.
+export WEB_CONCURRENCY=${WEB_CONCURRENCY:-$(available_cpus)}
+
 # Start the application with uvicorn
-exec uvicorn app:app --host 0.0.0.0 --port $PORT --workers 1
+exec uvicorn app:app --host 0.0.0.0 --port $PORT --workers $WEB_CONCURRENCY
@@ -0,0 +1,195 @@
+"""
+Tests for the admission, rate limiting and request coalescing primitives.
+
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+# ==================== AdmissionQueue ====================
+def test_slot_handed_to_cancelled_waiter_passes_on():
+    async def scenario():
+        queue = fitbot.AdmissionQueue("test", "Test", concurrency=1, max_waiting=4)
+        first_entered, second_entered = [], []
+
+        async def waiter(entered: list):
+            async with queue.slot():
+                entered.append(True)
+
+        async with queue.slot():
+            first = asyncio.create_task(waiter(first_entered))
+            second = asyncio.create_task(waiter(second_entered))
+            await asyncio.sleep(0)
+            assert queue.stats()["waiting"] == 2
+        # Leaving the block handed the slot to the first waiter; cancel it
+        # before it gets to run: the slot must move on, not leak
+        first.cancel()
+        await asyncio.gather(first, second, return_exceptions=True)
+
+        assert first.cancelled() and not first_entered
+        assert second_entered
+        assert queue.stats()["active"] == 0
+        assert queue.stats()["waiting"] == 0
+
+    run(scenario())
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        queue = fitbot.AdmissionQueue("test", "Test", concurrency=1, max_waiting=4)
+        async with queue.slot():
+            waiter = asyncio.create_task(queue.slot().__aenter__())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            assert queue.stats()["waiting"] == 0
+        assert queue.stats()["active"] == 0
+
+    run(scenario())
+
+
+def test_interactive_waiters_go_first():
+    async def scenario():
+        queue = fitbot.AdmissionQueue("test", "Test", concurrency=1, max_waiting=4)
+        order = []
+
+        async def waiter(name: str, priority: int):
+            async with queue.slot(priority):
+                order.append(name)
+
+        async with queue.slot():
+            tasks = [
+                asyncio.create_task(waiter("bulk", fitbot.PRIORITY_BULK)),
+                asyncio.create_task(waiter("interactive", fitbot.PRIORITY_INTERACTIVE)),
+            ]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "bulk"]
+
+    run(scenario())
+
+
+def test_bulk_rejected_beyond_its_queue_share():
+    async def scenario():
+        queue = fitbot.AdmissionQueue("test", "Test", concurrency=1, max_waiting=4)
+        bulk_limit = int(queue.max_waiting * fitbot.BULK_QUEUE_SHARE)
+        async with queue.slot():
+            waiters = [asyncio.create_task(queue.slot(fitbot.PRIORITY_BULK).__aenter__()) for _ in range(bulk_limit)]
+            await asyncio.sleep(0)
+            assert queue.stats()["waiting"] == bulk_limit
+
+            with pytest.raises(HTTPException) as rejected:
+                queue.check(fitbot.PRIORITY_BULK)
+            assert rejected.value.status_code == 429
+            assert int(rejected.value.headers["Retry-After"]) >= 1
+
+            # Interactive callers can still use the rest of the queue
+            queue.check(fitbot.PRIORITY_INTERACTIVE)
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+        assert queue.stats()["rejected"] == 1
+
+    run(scenario())
+
+
+def test_interactive_rejected_when_queue_full():
+    async def scenario():
+        queue = fitbot.AdmissionQueue("test", "Test", concurrency=1, max_waiting=2)
+        async with queue.slot():
+            waiters = [asyncio.create_task(queue.slot().__aenter__()) for _ in range(2)]
+            await asyncio.sleep(0)
+            with pytest.raises(HTTPException) as rejected:
+                async with queue.slot():
+                    pass
+            assert rejected.value.status_code == 429
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.gather(*waiters, return_exceptions=True)
+
+    run(scenario())
+
+
+# ==================== RateLimiter ====================
+def test_rate_limiter_allows_burst_then_waits():
+    limiter = fitbot.RateLimiter(rate_per_minute=60, burst=2, max_keys=10)
+    assert limiter.acquire("u1") == 0
+    assert limiter.acquire("u1") == 0
+    wait = limiter.acquire("u1")
+    assert 0 < wait <= 1
+    assert limiter.acquire("u2") == 0  # buckets are per key
+    assert limiter.limited == 1
+
+
+def test_rate_limiter_disabled_at_zero_rate():
+    limiter = fitbot.RateLimiter(rate_per_minute=0, burst=1, max_keys=10)
+    assert all(limiter.acquire("u1") == 0 for _ in range(100))
+
+
+# ==================== SingleFlight ====================
+def test_single_flight_shares_one_call():
+    async def scenario():
+        flight = fitbot.SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "ok"
+
+        results = await asyncio.gather(*(flight.run("k", work) for _ in range(5)))
+        assert results == ["ok"] * 5
+        assert calls == 1
+        assert flight.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_single_flight_cancels_work_with_last_waiter():
+    async def scenario():
+        flight = fitbot.SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(flight.run("k", work), 0.01)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert flight.stats()["in_flight"] == 0
+
+    run(scenario())
+
+
+def test_single_flight_survives_one_cancelled_waiter():
+    async def scenario():
+        flight = fitbot.SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "ok"
+
+        first = asyncio.create_task(flight.run("k", work))
+        second = asyncio.create_task(flight.run("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "ok"
+
+    run(scenario())
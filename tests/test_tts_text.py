@@ -0,0 +1,40 @@
+"""
+Tests for clean_text_for_tts.
+
+    python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+
+@pytest.mark.parametrize("text, spoken", [
+    ("- Push-ups: 3 sets of 8-10 reps", "Push-ups: 3 sets of 8 to 10 reps"),
+    ("- Squats: 3x15\n- Lunges: 3 x 12 reps", "Squats: 3 sets of 15.\nLunges: 3 sets of 12 reps"),
+    ("Plank: 3 sets of 30s", "Plank: 3 sets of 30 seconds"),
+    ("Rest 60s between sets.", "Rest 60 seconds between sets."),
+    ("Brisk walk: 20 min", "Brisk walk: 20 minutes"),
+    ("Aim for a 300–500 calorie deficit.", "Aim for a 300 to 500 calorie deficit."),
+])
+def test_workout_shorthand_spelled_out(text, spoken):
+    assert fitbot.clean_text_for_tts(text) == spoken
+
+
+@pytest.mark.parametrize("text", [
+    "I am in my 40s.",
+    "I loved 1990s aerobics.",
+    "Picture a 4x4 grid of mats.",
+    "Call 555-1234 to book.",
+    "My screen is 1920x1080.",
+])
+def test_other_numbers_left_alone(text):
+    assert fitbot.clean_text_for_tts(text) == text
+
+
+def test_markdown_and_emojis_removed():
+    text = "### 💪 Day 1\n**Watch** [this guide](https://youtu.be/x) for `form`!"
+    assert fitbot.clean_text_for_tts(text) == "Day 1.\nWatch this guide for form!"
@@ -0,0 +1,58 @@
+"""
+Tests for TutorialCatalog lookups.
+
+    python -m pytest tests
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import app as fitbot  # noqa: E402
+
+EXERCISES = [
+    {"name": "bench press", "links": ["https://youtu.be/bench"]},
+    {"name": "leg press", "links": ["https://youtu.be/leg"]},
+    {"name": "bicep curl", "links": ["https://youtu.be/curl"]},
+    {"name": "squats", "links": ["https://youtu.be/squat"], "aliases": ["squat"]},
+    {"name": "beginner workout", "links": ["https://youtu.be/beginner"]},
+]
+
+
+def matched_exercises(catalog, query: str) -> list:
+    status, body, _ = catalog.lookup(query)
+    assert status == 200, f"{query!r} -> {status}"
+    data = json.loads(body)
+    return [match["exercise"] for match in data["matches"]] if "matches" in data else [data["exercise"]]
+
+
+def test_exact_and_alias_lookup():
+    catalog = fitbot.TutorialCatalog(EXERCISES)
+    assert matched_exercises(catalog, "Squats") == ["Squats"]
+    assert matched_exercises(catalog, "squat") == ["Squats"]
+
+
+def test_partial_lookup_by_word():
+    catalog = fitbot.TutorialCatalog(EXERCISES)
+    assert matched_exercises(catalog, "press") == ["Bench Press", "Leg Press"]
+    assert matched_exercises(catalog, "curl") == ["Bicep Curl"]
+
+
+def test_prefix_lookup_on_last_word():
+    catalog = fitbot.TutorialCatalog(EXERCISES)
+    assert matched_exercises(catalog, "bench pr") == ["Bench Press"]
+    assert matched_exercises(catalog, "pre") == ["Bench Press", "Leg Press"]
+
+
+def test_typo_lookup():
+    catalog = fitbot.TutorialCatalog(EXERCISES)
+    assert matched_exercises(catalog, "sqauts") == ["Squats"]
+
+
+def test_miss_lists_every_exercise_and_is_not_memoized():
+    catalog = fitbot.TutorialCatalog(EXERCISES)
+    status, body, etag = catalog.lookup("zumba")
+    assert status == 404
+    assert json.loads(body)["available_exercises"] == [e["name"] for e in EXERCISES]
+    assert catalog.lookup("zumba") == (status, body, etag)
+    assert "zumba" not in catalog._lookups